@@ -0,0 +1,81 @@
+class CompanyIndex:
+    """
+    Индекс названий компаний для поиска упоминаний в тексте новости.
+
+    Нормализованные названия (normalize_name) разбиваются на слова и
+    складываются в префиксное дерево по словам. Поиск идёт одним проходом
+    по словам текста: от каждого слова дерево спускается, пока следующие
+    слова совпадают. Сложность — O(слов в тексте × длина самого длинного
+    названия) независимо от числа компаний в базе, и совпадения всегда
+    целыми словами («ромашка» не находится в «ромашкапро»). Одно
+    название может принадлежать нескольким ИНН («ИП Иванов» и «ООО
+    Иванов» оба нормализуются в «иванов») — в узле хранится их множество.
+    """
+
+    _END = None  # ключ узла, в котором заканчивается название: множество ИНН
+
+    def __init__(self):
+        self._root: dict = {}
+        self.size = 0  # пар (название, ИНН)
+
+    @classmethod
+    def build(cls, companies) -> "CompanyIndex":
+        """companies: пары (нормализованное название, ИНН)."""
+        index = cls()
+        for clean_name, inn in companies:
+            index.add(clean_name, inn)
+        return index
+
+    def add(self, clean_name: str, inn: str):
+        tokens = clean_name.split()
+        if not tokens:
+            return
+        node = self._root
+        for token in tokens:
+            node = node.setdefault(token, {})
+        inns = node.setdefault(self._END, set())
+        if inn not in inns:
+            inns.add(inn)
+            self.size += 1
+
+    def remove(self, clean_name: str, inn: str):
+        """Убирает пару (название, ИНН); другие ИНН с тем же названием остаются, пустые ветки удаляются."""
+        tokens = clean_name.split()
+        path = [self._root]
+        for token in tokens:
+            node = path[-1].get(token)
+            if node is None:
+                return
+            path.append(node)
+        inns = path[-1].get(self._END)
+        if not tokens or not inns or inn not in inns:
+            return
+        inns.discard(inn)
+        self.size -= 1
+        if inns:
+            return
+        del path[-1][self._END]
+        for depth in range(len(tokens), 0, -1):
+            if path[depth]:
+                break
+            del path[depth - 1][tokens[depth - 1]]
+
+    def search(self, clean_text: str) -> list[str]:
+        """
+        ИНН всех компаний, упомянутых в нормализованном тексте, в порядке
+        первого упоминания (без повторов). Вложенные названия («звезда»
+        внутри «завод звезда») находятся оба, у общего названия — все его ИНН.
+        """
+        tokens = clean_text.split()
+        found, seen = [], set()
+        for start in range(len(tokens)):
+            node = self._root
+            for token in tokens[start:]:
+                node = node.get(token)
+                if node is None:
+                    break
+                for inn in sorted(node.get(self._END, ())):
+                    if inn not in seen:
+                        seen.add(inn)
+                        found.append(inn)
+        return found
@@ -0,0 +1,297 @@
+import os
+import csv
+import json
+import time
+import shutil
+import hashlib
+from typing import NamedTuple
+
+import numpy as np
+
+# Маппинг суффиксов месяцев на русские названия
+MONTH_NAMES = {
+    "jan": "Янв", "feb": "Фев", "mar": "Мар", "apr": "Апр",
+    "may": "Май", "jun": "Июн", "jul": "Июл", "aug": "Авг",
+    "sep": "Сен", "oct": "Окт", "nov": "Ноя", "dec": "Дек",
+}
+# Порядок для сортировки
+MONTH_ORDER = ["sep", "oct", "nov", "dec", "jan", "feb", "mar", "apr", "may", "jun", "jul", "aug"]
+
+# Помесячные колонки CSV: префикс → (имя массива, тип)
+MONTHLY_COLUMNS = {
+    "empl_pay_": ("empl_pay", np.int64),
+    "empl_nopay_": ("empl_nopay", np.int64),
+    "share_pay_": ("share_pay", np.float64),
+    "avg_sal_": ("avg_sal", np.float64),
+}
+MISSING_INT = -1  # пустая / нечисловая ячейка в целочисленной колонке (во float — NaN)
+COLUMNS = ("inn", "name", "empl_pay", "empl_nopay", "share_pay", "avg_sal",
+           "trend_first", "trend_last", "share_delta", "fingerprint")
+META_FILE = "meta.json"
+STORE_VERSION = 2
+
+
+def detect_months(columns) -> list:
+    """
+    Определяет, какие месяцы есть в CSV (по заголовку или ключам строки).
+    Ищет колонки вида 'share_pay_XXX' и извлекает суффиксы.
+    """
+    months = []
+    for key in columns:
+        if key.startswith("share_pay_"):
+            suffix = key.replace("share_pay_", "")
+            if suffix in MONTH_NAMES:
+                months.append(suffix)
+    # Сортируем по порядку
+    months.sort(key=lambda m: MONTH_ORDER.index(m) if m in MONTH_ORDER else 99)
+    return months
+
+
+def _parse(value, dtype):
+    # Встроенные int/float заметно быстрее скаляров NumPy на сотнях тысяч ячеек
+    try:
+        return int(value) if dtype is np.int64 else float(value)
+    except (TypeError, ValueError):
+        return MISSING_INT if dtype is np.int64 else np.nan
+
+
+def source_signature(csv_path: str) -> dict:
+    """Размер и mtime CSV — по ним хранилище понимает, что выгрузка сменилась."""
+    st = os.stat(csv_path)
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _fingerprint(row: dict) -> int:
+    # Отпечаток строки CSV целиком: совпал — компанию можно не разбирать заново
+    raw = "\x1f".join(f"{key}={value}" for key, value in row.items())
+    return int.from_bytes(hashlib.blake2b(raw.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _read_csv(csv_path: str) -> tuple[list, dict]:
+    """Месяцы из заголовка и строки {ИНН: строка}; при повторе ИНН побеждает последняя."""
+    with open(csv_path, "r", encoding="utf-8") as f:
+        reader = csv.DictReader(f)
+        months = detect_months(reader.fieldnames or [])
+        rows = {}
+        for row in reader:
+            inn = (row.get("inn") or "").strip()
+            if inn:
+                rows[inn] = row
+    return months, rows
+
+
+class CompanyDiff(NamedTuple):
+    """Что поменялось между выгрузками: (название, ИНН) для индекса названий."""
+    removed: list
+    added: list
+
+
+class CompanyRecord(NamedTuple):
+    """Данные одной компании: помесячные массивы по оси months + готовый тренд."""
+    inn: str
+    name: str
+    months: list
+    empl_pay: np.ndarray
+    empl_nopay: np.ndarray
+    share_pay: np.ndarray
+    avg_sal: np.ndarray
+    trend_first: int      # индекс первого месяца с известной долей (-1 — тренда нет)
+    trend_last: int
+    share_delta: float
+
+
+class CompanyStore:
+    """
+    Колоночное хранилище клиентской базы INN Experiment.
+
+    CSV один раз разбирается в массивы NumPy: inn и name — по строке на
+    компанию, помесячные показатели — матрицы (компании × месяцы), плюс
+    заранее посчитанный тренд доли ФОТ (первый/последний известный месяц
+    и дельта) и отпечаток исходной строки. Массивы лежат отдельными .npy
+    в подкаталоге-поколении store_dir и открываются через mmap, так что
+    вся база не читается в память при старте, а повторный запуск с тем же
+    CSV вообще не разбирает его. Строки отсортированы по ИНН — поиск по
+    ИНН через searchsorted.
+
+    Новая выгрузка применяется через update(): заново разбираются только
+    строки с изменившимся отпечатком, остальные копируются из старых
+    массивов. Каждое сохранение пишет новое поколение, поэтому уже
+    открытое (и ещё используемое) хранилище не перезаписывается.
+    """
+
+    def __init__(self, columns: dict, months: list):
+        self.months = months
+        self.inn = columns["inn"]
+        self.name = columns["name"]
+        self.empl_pay = columns["empl_pay"]
+        self.empl_nopay = columns["empl_nopay"]
+        self.share_pay = columns["share_pay"]
+        self.avg_sal = columns["avg_sal"]
+        self.trend_first = columns["trend_first"]
+        self.trend_last = columns["trend_last"]
+        self.share_delta = columns["share_delta"]
+        self.fingerprint = columns["fingerprint"]
+
+    def __len__(self) -> int:
+        return len(self.inn)
+
+    @classmethod
+    def from_csv(cls, csv_path: str) -> "CompanyStore":
+        months, rows = _read_csv(csv_path)
+        return cls.from_rows([rows[inn] for inn in sorted(rows)], months)
+
+    @classmethod
+    def from_rows(cls, rows: list, months: list) -> "CompanyStore":
+        """rows — строки CSV (dict), уже отсортированные по ИНН."""
+        n, m = len(rows), len(months)
+        columns = {
+            "inn": np.array([r["inn"].strip() for r in rows], dtype=str),
+            "name": np.array([r.get("name") or "" for r in rows], dtype=str),
+            "fingerprint": np.array([_fingerprint(r) for r in rows], dtype=np.uint64),
+        }
+        for prefix, (key, dtype) in MONTHLY_COLUMNS.items():
+            values = [[_parse(r.get(prefix + month), dtype) for month in months] for r in rows]
+            columns[key] = np.array(values, dtype=dtype).reshape(n, m)
+
+        # Тренд доли ФОТ: от первого до последнего месяца с известной долей
+        share = columns["share_pay"]
+        first = np.full(n, -1)
+        last = np.full(n, -1)
+        delta = np.full(n, np.nan)
+        if m:
+            known = ~np.isnan(share)
+            rows_with_trend = np.flatnonzero(known.sum(axis=1) >= 2)
+            first[rows_with_trend] = known[rows_with_trend].argmax(axis=1)
+            last[rows_with_trend] = m - 1 - known[rows_with_trend, ::-1].argmax(axis=1)
+            delta[rows_with_trend] = np.round(
+                share[rows_with_trend, last[rows_with_trend]] - share[rows_with_trend, first[rows_with_trend]], 2
+            )
+        columns["trend_first"] = first.astype(np.int8)
+        columns["trend_last"] = last.astype(np.int8)
+        columns["share_delta"] = delta
+        return cls(columns, months)
+
+    def save(self, store_dir: str, source: dict | None = None):
+        generation = str(time.time_ns())
+        gen_dir = os.path.join(store_dir, generation)
+        os.makedirs(gen_dir, exist_ok=True)
+        for key in COLUMNS:
+            np.save(os.path.join(gen_dir, key + ".npy"), np.asarray(getattr(self, key)))
+        # meta пишется последним и атомарно: до этого момента действует прежнее поколение
+        meta = {"version": STORE_VERSION, "generation": generation, "months": self.months,
+                "rows": len(self), "source": source}
+        tmp = os.path.join(store_dir, META_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, os.path.join(store_dir, META_FILE))
+        # Старые поколения: открытые через mmap файлы (Windows) удалятся при следующем сохранении
+        for entry in os.listdir(store_dir):
+            path = os.path.join(store_dir, entry)
+            if entry != generation and os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+
+    @classmethod
+    def load(cls, store_dir: str) -> "CompanyStore":
+        meta = cls._read_meta(store_dir)
+        gen_dir = os.path.join(store_dir, meta["generation"])
+        columns = {}
+        for key in COLUMNS:
+            columns[key] = np.load(os.path.join(gen_dir, key + ".npy"), mmap_mode="r")
+        return cls(columns, meta["months"])
+
+    @staticmethod
+    def _read_meta(store_dir: str) -> dict:
+        with open(os.path.join(store_dir, META_FILE), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @classmethod
+    def open(cls, csv_path: str, store_dir: str) -> "CompanyStore":
+        """Открывает хранилище через mmap; если CSV изменился — пересобирает его."""
+        source = source_signature(csv_path)
+        try:
+            meta = cls._read_meta(store_dir)
+            if meta.get("version") == STORE_VERSION and meta.get("source") == source:
+                return cls.load(store_dir)
+        except (OSError, ValueError, KeyError):
+            pass
+        print(f"[INN Experiment] Сборка колоночного хранилища из {csv_path}")
+        cls.from_csv(csv_path).save(store_dir, source)
+        return cls.load(store_dir)
+
+    def update(self, csv_path: str, store_dir: str) -> tuple["CompanyStore", CompanyDiff]:
+        """
+        Применяет новую выгрузку CSV как дифф к текущему хранилищу.
+        Возвращает новое хранилище (уже сохранённое и открытое через mmap)
+        и изменения для индекса названий. Текущее хранилище не меняется.
+        """
+        source = source_signature(csv_path)
+        months, rows = _read_csv(csv_path)
+        if months != self.months:
+            # Сменился набор месяцев — помесячные матрицы несовместимы, собираем целиком
+            fresh = CompanyStore.from_rows([rows[inn] for inn in sorted(rows)], months)
+            fresh.save(store_dir, source)
+            diff = CompanyDiff(
+                removed=[(str(name), str(inn)) for name, inn in zip(self.name, self.inn)],
+                added=[(str(name), str(inn)) for name, inn in zip(fresh.name, fresh.inn)],
+            )
+            return CompanyStore.load(store_dir), diff
+
+        inns = sorted(rows)
+        new_inn = np.array(inns, dtype=str)
+        new_fp = np.array([_fingerprint(rows[inn]) for inn in inns], dtype=np.uint64)
+
+        # Где каждая строка новой выгрузки лежит в старом хранилище
+        pos = np.searchsorted(self.inn, new_inn)
+        pos_clipped = np.minimum(pos, max(len(self) - 1, 0))
+        if len(self):
+            exists = (pos < len(self)) & (self.inn[pos_clipped] == new_inn)
+            same = exists & (self.fingerprint[pos_clipped] == new_fp)
+        else:
+            exists = same = np.zeros(len(inns), dtype=bool)
+        changed = np.flatnonzero(~same)   # новые и изменённые ИНН — только их разбираем
+        kept = np.flatnonzero(same)
+
+        fresh = CompanyStore.from_rows([rows[inns[i]] for i in changed], months)
+        columns = {"inn": new_inn}
+        for key in COLUMNS[1:]:
+            old_col, fresh_col = np.asarray(getattr(self, key)), getattr(fresh, key)
+            col = np.empty((len(inns),) + old_col.shape[1:], dtype=np.result_type(old_col, fresh_col))
+            col[kept] = old_col[pos[kept]]
+            col[changed] = fresh_col
+            columns[key] = col
+        merged = CompanyStore(columns, months)
+        merged.save(store_dir, source)
+
+        removed_rows = np.union1d(
+            np.flatnonzero(~np.isin(self.inn, new_inn)),   # ИНН пропали из выгрузки
+            pos[exists & ~same],                          # ИНН остались, но строка изменилась
+        ).astype(np.int64)
+        diff = CompanyDiff(
+            removed=[(str(self.name[i]), str(self.inn[i])) for i in removed_rows],
+            added=[(str(name), str(inn)) for name, inn in zip(fresh.name, fresh.inn)],
+        )
+        return CompanyStore.load(store_dir), diff
+
+    def find(self, inn: str) -> int | None:
+        """Номер строки по ИНН или None."""
+        i = int(np.searchsorted(self.inn, inn))
+        if i < len(self.inn) and self.inn[i] == inn:
+            return i
+        return None
+
+    def record(self, inn: str) -> CompanyRecord | None:
+        i = self.find(inn)
+        if i is None:
+            return None
+        return CompanyRecord(
+            inn=str(self.inn[i]),
+            name=str(self.name[i]),
+            months=self.months,
+            empl_pay=self.empl_pay[i],
+            empl_nopay=self.empl_nopay[i],
+            share_pay=self.share_pay[i],
+            avg_sal=self.avg_sal[i],
+            trend_first=int(self.trend_first[i]),
+            trend_last=int(self.trend_last[i]),
+            share_delta=float(self.share_delta[i]),
+        )
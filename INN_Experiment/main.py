@@ -2,7 +2,8 @@ import logging
 import re
 import asyncio
 import json
-import csv
+import os
+import math
 from pathlib import Path
 from typing import List
 from telethon import TelegramClient, events
@@ -11,6 +12,9 @@ from telethon import TelegramClient, events
 from newsendingbot.offer_generator import generate_offer_async
 from newsendingbot.process_logging import log_news_process
 from newsendingbot.deduplicator import Deduplicator
+from INN_Experiment.company_index import CompanyIndex
+from INN_Experiment.company_store import CompanyStore, CompanyRecord, MONTH_NAMES, MISSING_INT, source_signature
+from src.entity_cache import EntityCache
 
 # --- НАСТРОЙКИ ---
 CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "config.json"
@@ -24,6 +28,7 @@ cfg = load_config()
 API_ID = int(cfg['api_id']) if str(cfg.get('api_id', '')).isdigit() else 0
 API_HASH = cfg.get('api_hash', '*****')
 BOT_TOKEN = cfg.get('bot_token', '*****')
+COMPANY_RELOAD_SECONDS = cfg.get('company_reload_seconds', 60)
 
 # Глобальный семафор для ограничения одновременных запросов к LLM
 llm_semaphore = asyncio.Semaphore(1)
@@ -78,7 +83,11 @@ async def llm_judge_is_duplicate(new_news: str, existing_news: str) -> bool:
     return False
 
 # --- ЗАГРУЗКА ДАННЫХ КОМПАНИЙ (INN Experiment) ---
-COMPANY_DB = {}
+COMPANY_CSV = "INN_Experiment/company_data.csv"
+COMPANY_STORE_DIR = "INN_Experiment/company_store"  # колоночная копия CSV (.npy, mmap)
+COMPANY_STORE = None
+COMPANY_SOURCE = None  # размер/mtime CSV, из которого собрано COMPANY_STORE
+COMPANY_INDEX = CompanyIndex()  # название → ИНН (одно или несколько), при новой выгрузке обновляется диффом
 
 def normalize_name(name: str) -> str:
     """
@@ -97,108 +106,122 @@ def normalize_name(name: str) -> str:
     n = re.sub(r"\s+", " ", n).strip()
     return n
 
+def _open_company_data():
+    # Тяжёлая часть загрузки (разбор CSV, индекс) — вызывается и из потока
+    source = source_signature(COMPANY_CSV)
+    store = CompanyStore.open(COMPANY_CSV, COMPANY_STORE_DIR)
+    # Ищем по "чистому" имени
+    index = CompanyIndex.build(
+        (normalize_name(str(name)), str(inn)) for name, inn in zip(store.name, store.inn)
+    )
+    return store, index, source
+
+def _update_company_data(store: CompanyStore):
+    # Новая выгрузка как дифф к текущему хранилищу: разбираются только изменённые ИНН
+    source = source_signature(COMPANY_CSV)
+    new_store, diff = store.update(COMPANY_CSV, COMPANY_STORE_DIR)
+    removed = [(normalize_name(name), inn) for name, inn in diff.removed]
+    added = [(normalize_name(name), inn) for name, inn in diff.added]
+    return new_store, removed, added, source
+
 def load_company_data():
-    global COMPANY_DB
-    COMPANY_DB = {} # Сброс при перезагрузке
+    global COMPANY_STORE, COMPANY_INDEX, COMPANY_SOURCE
+    COMPANY_STORE = None # Сброс при перезагрузке
+    COMPANY_INDEX = CompanyIndex()
+    COMPANY_SOURCE = None
     try:
-        csv_path = Path("INN_Experiment/company_data.csv")
-        if not csv_path.exists():
+        if not os.path.exists(COMPANY_CSV):
              return
-             
-        with open(csv_path, "r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                # Сохраняем по "чистому" имени
-                clean_key = normalize_name(row["name"])
-                if clean_key:
-                    COMPANY_DB[clean_key] = row
+
+        COMPANY_STORE, COMPANY_INDEX, COMPANY_SOURCE = _open_company_data()
+        print(f"[INN Experiment] Загружено компаний: {len(COMPANY_STORE)}")
     except Exception as e:
         print(f"[INN Experiment] Ошибка загрузки CSV: {e}")
 
 load_company_data()
 
-def search_company_data(text: str):
+async def watch_company_data():
     """
-    Ищет упоминание компании в тексте новости.
-    Возвращает СПИСОК найденных записей (list of dict).
+    Следит за company_data.csv и подменяет базу без перезапуска бота.
+    Новая выгрузка применяется, когда её размер и mtime не менялись
+    между двумя проверками (файл дописан). Разбор идёт в потоке, а
+    правка индекса и подмена хранилища — одним синхронным блоком в
+    event loop, так что search_company_data видит либо старую базу,
+    либо новую целиком.
     """
-    # Нормализуем текст новости так же, как имена компаний
-    t_norm = normalize_name(text)
-    
-    found_companies = []
-    
-    for clean_name, data in COMPANY_DB.items():
-        # Ищем чистое имя в чистом тексте
-        if clean_name in t_norm:
-             found_companies.append(data)
-             
-    return found_companies
-
-# Маппинг суффиксов месяцев на русские названия
-MONTH_NAMES = {
-    "jan": "Янв", "feb": "Фев", "mar": "Мар", "apr": "Апр",
-    "may": "Май", "jun": "Июн", "jul": "Июл", "aug": "Авг",
-    "sep": "Сен", "oct": "Окт", "nov": "Ноя", "dec": "Дек",
-}
-# Порядок для сортировки
-MONTH_ORDER = ["sep", "oct", "nov", "dec", "jan", "feb", "mar", "apr", "may", "jun", "jul", "aug"]
+    global COMPANY_STORE, COMPANY_INDEX, COMPANY_SOURCE
+    seen = None
+    while True:
+        await asyncio.sleep(COMPANY_RELOAD_SECONDS)
+        try:
+            if not os.path.exists(COMPANY_CSV):
+                continue
+            source = source_signature(COMPANY_CSV)
+            if source == COMPANY_SOURCE or source != seen:
+                seen = source
+                continue
+
+            if COMPANY_STORE is None:
+                COMPANY_STORE, COMPANY_INDEX, COMPANY_SOURCE = await asyncio.to_thread(_open_company_data)
+                logger.info(f"[INN Experiment] База компаний загружена: {len(COMPANY_STORE)}")
+                continue
+
+            store, removed, added, source = await asyncio.to_thread(_update_company_data, COMPANY_STORE)
+            for clean_name, inn in removed:
+                COMPANY_INDEX.remove(clean_name, inn)
+            for clean_name, inn in added:
+                COMPANY_INDEX.add(clean_name, inn)
+            COMPANY_STORE, COMPANY_SOURCE = store, source
+            logger.info(
+                f"[INN Experiment] База компаний обновлена: {len(store)} компаний, "
+                f"изменено/добавлено {len(added)}, удалено/заменено {len(removed)}"
+            )
+        except Exception as e:
+            logger.error(f"[INN Experiment] Ошибка перезагрузки CSV: {e}")
 
-def detect_months(company_row: dict) -> list:
+def search_company_data(text: str):
     """
-    Определяет, какие месяцы есть в строке CSV.
-    Ищет ключи вида 'share_pay_XXX' и извлекает суффиксы.
+    Ищет упоминание компании в тексте новости.
+    Возвращает СПИСОК найденных записей (list of CompanyRecord).
     """
-    months = []
-    for key in company_row.keys():
-        if key.startswith("share_pay_"):
-            suffix = key.replace("share_pay_", "")
-            if suffix in MONTH_NAMES:
-                months.append(suffix)
-    # Сортируем по порядку
-    months.sort(key=lambda m: MONTH_ORDER.index(m) if m in MONTH_ORDER else 99)
-    return months
-
-def build_company_context(company_info: dict) -> str:
+    if COMPANY_STORE is None:
+        return []
+    # Нормализуем текст новости так же, как имена компаний,
+    # и ищем все названия одним проходом по индексу (целыми словами)
+    found = [COMPANY_STORE.record(inn) for inn in COMPANY_INDEX.search(normalize_name(text))]
+    return [company for company in found if company is not None]
+
+def build_company_context(company: CompanyRecord) -> str:
     """
     Формирует компактный текстовый блок с данными о компании для LLM.
-    Автоматически определяет месяцы из CSV-колонок.
+    Месяцы и тренд доли ФОТ уже посчитаны в колоночном хранилище.
     """
-    months = detect_months(company_info)
+    months = company.months
     
     context = f"══════════════════════════════\n"
-    context += f"Компания: {company_info['name']}\n"
-    context += f"ИНН: {company_info['inn']}\n\n"
+    context += f"Компания: {company.name}\n"
+    context += f"ИНН: {company.inn}\n\n"
     
     # Компактная таблица по месяцам
     context += "Помесячная статистика:\n"
     
-    shares = []
-    for m in months:
+    for i, m in enumerate(months):
         label = MONTH_NAMES.get(m, m)
-        e_pay = company_info.get(f"empl_pay_{m}", "?")
-        e_nopay = company_info.get(f"empl_nopay_{m}", "?")
-        share = company_info.get(f"share_pay_{m}", "?")
-        avg_sal = company_info.get(f"avg_sal_{m}", "?")
-        
-        try:
-            total = int(e_pay) + int(e_nopay)
-        except:
-            total = "?"
+        e_pay = _fmt_count(company.empl_pay[i])
+        e_nopay = _fmt_count(company.empl_nopay[i])
+        total = _fmt_count(company.empl_pay[i] + company.empl_nopay[i]) if "?" not in (e_pay, e_nopay) else "?"
+        share = _fmt_number(company.share_pay[i], "{:.2f}")
+        avg_sal = _fmt_number(company.avg_sal[i], "{:.0f}")
         
         context += f"  {label}: {e_pay} с ФОТ из {total}, доля={share}, ср.ЗП={avg_sal}\n"
-        
-        try:
-            shares.append(float(share))
-        except:
-            pass
     
     # Тренд за весь период
-    if len(shares) >= 2:
-        first = shares[0]
-        last = shares[-1]
-        delta = round(last - first, 2)
-        first_month = MONTH_NAMES.get(months[0], months[0])
-        last_month = MONTH_NAMES.get(months[-1], months[-1])
+    if company.trend_first >= 0:
+        first = float(company.share_pay[company.trend_first])
+        last = float(company.share_pay[company.trend_last])
+        delta = company.share_delta
+        first_month = MONTH_NAMES.get(months[company.trend_first], months[company.trend_first])
+        last_month = MONTH_NAMES.get(months[company.trend_last], months[company.trend_last])
         
         if delta < 0:
             trend = f"СНИЖЕНИЕ на {abs(delta)} за период ({first_month}: {first} → {last_month}: {last})"
@@ -212,6 +235,12 @@ def build_company_context(company_info: dict) -> str:
     context += f"══════════════════════════════\n\n"
     return context
 
+def _fmt_count(value) -> str:
+    return "?" if value == MISSING_INT else str(int(value))
+
+def _fmt_number(value, fmt: str) -> str:
+    return "?" if math.isnan(value) else fmt.format(value)
+
 
 # --- Промты для пользователей ---
 SYSTEM_PROMPT = """
@@ -458,6 +487,9 @@ logger = logging.getLogger(__name__)
 SESSION_NAME = str(Path(__file__).resolve().parent / "inn_experiment_session")
 client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
 
+# Кэш каналов (peer id → username): без сетевого get_chat после перезапуска
+entity_cache = EntityCache(str(Path(__file__).resolve().parent / "entity_cache.json"))
+
 # Множество для хранения ID обработанных сообщений
 processed_messages = set()
 
@@ -467,8 +499,11 @@ async def handle_new_message(event):
         if not event.is_channel:
             return
             
-        sender = await event.get_chat()
-        channel_username = getattr(sender, 'username', None)
+        if event.chat is not None:
+            sender = entity_cache.remember(event.chat)  # заметит смену username
+        else:
+            sender = await entity_cache.get_info(client, event.chat_id)
+        channel_username = sender.get('username')
         channel_key = f"@{channel_username}" if channel_username else None
         
         if channel_key and channel_key not in CHANNELS:
@@ -603,6 +638,7 @@ async def handle_new_message(event):
 async def main():
     logger.info("INN Experiment Bot (Telethon) запускается...")
     await client.start(bot_token=BOT_TOKEN)
+    asyncio.create_task(watch_company_data())
     logger.info("Бот на связи!")
     await client.run_until_disconnected()
 
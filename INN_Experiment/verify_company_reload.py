@@ -0,0 +1,101 @@
+import os
+import csv
+import shutil
+import asyncio
+import tempfile
+import INN_Experiment.main as bot
+from INN_Experiment.company_index import CompanyIndex
+from INN_Experiment.company_store import source_signature
+
+TEST_DIR = tempfile.mkdtemp(prefix="inn_reload_verify_")
+bot.COMPANY_CSV = os.path.join(TEST_DIR, "company_data.csv")
+bot.COMPANY_STORE_DIR = os.path.join(TEST_DIR, "company_store")
+bot.COMPANY_RELOAD_SECONDS = 0.05
+
+with open("INN_Experiment/company_data.csv", "r", encoding="utf-8") as f:
+    reader = csv.DictReader(f)
+    FIELDS = reader.fieldnames
+    ROWS = {row["inn"]: row for row in reader}
+
+
+def write_csv(rows: dict):
+    with open(bot.COMPANY_CSV, "w", encoding="utf-8", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        writer.writerows(rows.values())
+
+
+def found_inns(text: str) -> list:
+    return [company.inn for company in bot.search_company_data(text)]
+
+
+async def reload():
+    # Фоновый наблюдатель применяет новую выгрузку, когда файл перестал меняться
+    watcher = asyncio.create_task(bot.watch_company_data())
+    target = source_signature(bot.COMPANY_CSV)
+    for _ in range(100):
+        await asyncio.sleep(bot.COMPANY_RELOAD_SECONDS)
+        if bot.COMPANY_SOURCE == target:
+            break
+    watcher.cancel()
+    assert bot.COMPANY_SOURCE == target, "Watcher did not apply the new export"
+
+
+print("Starting company database hot-reload verification...")
+
+# 1. Исходная выгрузка
+print("\n--- Step 1: initial load ---")
+write_csv(ROWS)
+bot.load_company_data()
+print(f"Айсберг: {found_inns('ООО «Айсберг» наняло сотрудников')} (Expected: ['2700000003'])")
+assert found_inns("ООО «Айсберг» наняло сотрудников") == ["2700000003"]
+assert found_inns("Компания Ромашка") == ["2724225050"]
+
+# 2. Новая выгрузка: переименование, удаление, изменение показателей
+print("\n--- Step 2: rename / remove / update ---")
+rows = {inn: dict(row) for inn, row in ROWS.items()}
+rows["2700000003"]["name"] = "ООО Торос"          # переименована
+del rows["2724225050"]                            # удалена (Ромашка)
+rows["2721098765"]["share_pay_feb"] = "0.50"      # изменились показатели (Звезда)
+write_csv(rows)
+asyncio.run(reload())
+
+print(f"Айсберг (old name): {found_inns('ООО Айсберг')} (Expected: [])")
+assert found_inns("ООО Айсберг") == []
+print(f"Торос (new name): {found_inns('ООО Торос')} (Expected: ['2700000003'])")
+assert found_inns("ООО Торос") == ["2700000003"]
+print(f"Ромашка (removed): {found_inns('Компания Ромашка')} (Expected: [])")
+assert found_inns("Компания Ромашка") == []
+zvezda = bot.search_company_data("Завод Звезда")[0]
+print(f"Звезда share_delta: {zvezda.share_delta} (Expected: -0.22)")
+assert zvezda.share_delta == -0.22
+assert found_inns("ИП Иванов") == ["2700000001"], "Unchanged companies must stay searchable"
+
+# 3. Два клиента с одним нормализованным названием: найти нужно обоих
+print("\n--- Step 3: shared name ---")
+rows["2700000099"] = dict(rows["2700000001"], inn="2700000099", name="ООО Иванов")
+write_csv(rows)
+asyncio.run(reload())
+print(f"Иванов: {found_inns('ИП Иванов')} (Expected: ['2700000001', '2700000099'])")
+assert found_inns("ИП Иванов") == ["2700000001", "2700000099"]
+
+# 4. Удаление одного из них не прячет второго
+print("\n--- Step 4: remove one of the shared name ---")
+del rows["2700000099"]
+write_csv(rows)
+asyncio.run(reload())
+print(f"Иванов: {found_inns('ИП Иванов')} (Expected: ['2700000001'])")
+assert found_inns("ИП Иванов") == ["2700000001"]
+
+# 5. Индекс после диффов совпадает с построенным с нуля
+print("\n--- Step 5: diff-applied index equals a full rebuild ---")
+fresh = CompanyIndex.build(
+    (bot.normalize_name(str(name)), str(inn)) for name, inn in zip(bot.COMPANY_STORE.name, bot.COMPANY_STORE.inn)
+)
+assert fresh._root == bot.COMPANY_INDEX._root and fresh.size == bot.COMPANY_INDEX.size
+print(f"Index size: {bot.COMPANY_INDEX.size} (Expected: {len(rows)})")
+
+print("\nALL TESTS PASSED! Renamed, removed and shared-name INNs are reflected in search after reload.")
+
+# Cleanup
+shutil.rmtree(TEST_DIR, ignore_errors=True)
@@ -3,6 +3,8 @@ import json
 from pathlib import Path
 from telethon import TelegramClient, events
 
+from src.entity_cache import EntityCache
+
 # --- НАСТРОЙКИ ---
 CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "config.json"
 
@@ -39,6 +41,9 @@ processed_messages = set()
 SESSION_NAME = str(Path(__file__).resolve().parent / "dvbnewsbot_session")
 client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
 
+# Кэш первоисточников пересланных постов (peer id → username), чтобы не звать get_entity на каждый пост
+entity_cache = EntityCache(str(Path(__file__).resolve().parent / "entity_cache.json"))
+
 @client.on(events.NewMessage)
 async def handle_new_message(event):
     try:
@@ -57,6 +62,8 @@ async def handle_new_message(event):
         
         # Пытаемся определить имя канала или ID для маппинга
         sender = await event.get_chat()
+        if sender is not None:
+            entity_cache.remember(sender)
         
         # Если это пост из канала (direct channel post)
         if hasattr(sender, 'username') and sender.username:
@@ -67,11 +74,14 @@ async def handle_new_message(event):
         # Если сообщение переслано, нам важнее КТО ПЕРВОИСТОЧНИК
         if message.fwd_from:
              try:
-                 original_channel = await client.get_entity(message.fwd_from.from_id)
-                 if hasattr(original_channel, 'username') and original_channel.username:
-                     channel_key = f"@{original_channel.username}"
+                 # Сущность первоисточника часто приходит вместе с апдейтом — обновляем по ней кэш (смена username)
+                 if message.forward and message.forward.chat is not None:
+                     entity_cache.remember(message.forward.chat)
+                 original_channel = await entity_cache.get_info(client, message.fwd_from.from_id)
+                 if original_channel.get('username'):
+                     channel_key = f"@{original_channel['username']}"
                  else:
-                     channel_key = str(original_channel.id)
+                     channel_key = str(original_channel['id'])
              except Exception:
                  # Если не удалось получить сущность пересланного канала, пропускаем
                  pass
@@ -7,27 +7,39 @@ import datetime
 import importlib
 
 from telethon import TelegramClient, events
-from telethon.errors import FloodWaitError
+from telethon.errors import ChannelInvalidError, ChannelPrivateError, FloodWaitError
 from telethon.sessions import StringSession
 from telethon.tl.functions.channels import JoinChannelRequest
 
+from src.checkpoints import CheckpointStore
 from src.deduplicator import Deduplicator
-from src.llm_classifier import classify_department, rate_engagement
-from src.logger import log_action, log_error
+from src.entity_cache import EntityCache
+from src.logger import log_action, log_error, sink as log_sink
+from src.pipeline import Pipeline, PRIORITY_REFILL
 from src.router import get_target_channel
-from src.summarizer import summarize_text
-from src.processor import handle_entry, batcher, deduper
+from src.processor import analyze, handle_entry, batcher, deduper
 
 # Загрузка конфигурации
 with open('config/config.json', 'r', encoding='utf-8-sig') as config_file:
     config = json.load(config_file)
 
-# Словарь: имя канала -> ID последнего обработанного сообщения
-last_ids: Dict[str, int] = {}
+# Чекпоинты: имя канала -> ID последнего полностью обработанного сообщения (на диске)
+checkpoints = CheckpointStore(
+    config.get('checkpoint_file', 'logs/checkpoints.json'),
+    flush_seconds=config.get('checkpoint_flush_seconds', 10),
+    max_retries=config.get('message_max_retries', 3),
+)
+# Имя канала -> ID последнего сообщения, поставленного в очередь (живого или из refill)
+refill_ids: Dict[str, int] = {}
+# Имя канала -> время (loop.time()), до которого Telegram просил не обращаться к каналу
+flood_until: Dict[str, float] = {}
 
 # Инициализация модулей
 interval = config.get('batch_interval_minutes', 10)
 
+# Кэш username → InputPeer для source_channels (без get_entity на каждом цикле)
+entity_cache = EntityCache(config.get('entity_cache_file', 'logs/entity_cache.json'))
+
 
 # Создание Telethon клиента (user.session)
 session_name = config.get('session_file', 'user.session')
@@ -39,6 +51,29 @@ client = TelegramClient(
 
 
 async def handle_message(msg, chat_username: str):
+    """
+    Обработчик очереди: обрабатывает сообщение и только после этого отмечает
+    его завершённым. При ошибке сообщение дозапрашивается в следующем refill
+    (чекпоинт канала за него не уходит), после message_max_retries неудачных
+    попыток — пропускается.
+    """
+    try:
+        await process_message(msg, chat_username)
+    except Exception:
+        if not checkpoints.fail(chat_username, msg.id):
+            print(f"[CHECKPOINTS] @{chat_username}/{msg.id}: попытки обработки исчерпаны, сообщение пропущено")
+        raise
+    checkpoints.complete(chat_username, msg.id)
+
+
+def on_pipeline_drop(handler, args):
+    # Вытесненное из очереди сообщение канала не обработано — refill запросит его снова
+    if handler is handle_message:
+        msg, chat_username = args
+        checkpoints.drop(chat_username, msg.id)
+
+
+async def process_message(msg, chat_username: str):
     """
     Обработка одного сообщения:
     - дедупликация
@@ -51,36 +86,22 @@ async def handle_message(msg, chat_username: str):
     if not text:
         return
 
-    # Обновляем ID последнего сообщения
-    last_ids[chat_username] = msg.id
-
     # Дедупликация: пропускаем, если дубликат
-    if deduper.is_duplicate(text):
+    if deduper.check_and_add(text):
         return
-    deduper.add(text)
 
     # Логируем получение новости
     link = f"https://t.me/{chat_username}/{msg.id}"
     log_action('GET', text, f"@{chat_username}")
 
-    # Получаем список департаментов (>=1 элемент)
-    departments = await classify_department(text)
-    print(departments)
-    if departments == ['Без категории']:
-        # На всякий случай, хотя из функции всегда возвращается минимум ['Без категории']
-        return
-    print(departments)
-    # Для каждого департамента делаем суммаризацию и оценку и отправляем в batcher
-    for dept in departments:
-        summary    = await summarize_text(text, dept)
-        print(summary)
-
-        # Пропускаем, если суммаризатор вернул пустой ответ
-        if not summary or "Пустой ответ" in summary:
-            continue
+    # Департаменты с резюме и оценкой (пустой список — «Без категории»)
+    for item in await analyze(text):
+        dept, summary, engagement = item["department"], item["summary"], item["engagement"]
+        print(dept, summary, engagement)
 
-        engagement = await rate_engagement(text, str(dept))
-        print(engagement)
+        # Пропускаем, если резюме пустое
+        if not summary:
+            continue
 
         payload = (
             f"{summary or text[:200] + '…'}\n\n"
@@ -91,68 +112,137 @@ async def handle_message(msg, chat_username: str):
         batcher.add(payload, target, engagement)
 
 
+# Очередь между приёмом сообщений и обработкой через LLM
+pipeline = Pipeline(
+    handle_message,
+    workers=config.get('pipeline_workers', 4),
+    maxsize=config.get('pipeline_queue_size', 200),
+    report_seconds=config.get('pipeline_report_seconds', 60),
+    on_drop=on_pipeline_drop,
+)
+
+
 @client.on(events.NewMessage(chats=config['source_channels']))
 async def forward(event):
-    """Хендлер для новых сообщений из указанных каналов"""
+    """Хендлер для новых сообщений: только ставит сообщение в очередь обработки"""
+    if event.chat is not None:
+        entity_cache.remember(event.chat)  # заметит смену username
     username = event.chat.username or str(event.chat.id)
-    await handle_message(event.message, username)
+    checkpoints.track(username, event.message.id)
+    if pipeline.submit(event.message, username):
+        # Сообщение уже в очереди — refill не должен запрашивать его повторно
+        refill_ids[username] = max(refill_ids.get(username, 0), event.message.id)
+    else:
+        print(f"[PIPELINE] Очередь заполнена, сообщение @{username}/{event.message.id} отброшено")
+
+
+async def refill_channel(channel: str, semaphore: asyncio.Semaphore) -> int:
+    """
+    Дозапрашивает новые сообщения одного канала и ставит их в очередь
+    обработки с низким приоритетом. Пока канал не догнал простой после
+    старта, запрос идёт от сохранённого чекпоинта (не больше
+    catchup_max_messages), после — от последнего поставленного в очередь.
+    Возвращает число поставленных сообщений.
+    """
+    uname = channel.lstrip('@')
+    loop = asyncio.get_running_loop()
+    if flood_until.get(uname, 0) > loop.time():
+        return 0  # ещё действует FloodWait по этому каналу
+
+    catching_up = checkpoints.is_held(uname)
+    limit = config.get('catchup_max_messages', 500) if catching_up else None
+    async with semaphore:
+        try:
+            entity = await entity_cache.get_input(client, uname)
+            if catching_up:
+                # Чекпоинт удержан с момента старта — живые сообщения не перепрыгнут пропуск
+                last_id = checkpoints.get(uname)
+            else:
+                last_id = max(checkpoints.get(uname), refill_ids.get(uname, 0))
+            refetch = checkpoints.refetch_from(uname)
+            if refetch is not None:
+                # Были вытеснены из очереди — запрашиваем заново с первого из них
+                last_id = min(last_id, refetch)
+            if not last_id:
+                # Новый канал: начинаем с последнего сообщения, историю не выкачиваем
+                latest = await client.get_messages(entity, limit=1)
+                if latest:
+                    checkpoints.mark(uname, latest[0].id)
+                checkpoints.release(uname)
+                print(f"[INIT] {channel}: last_id = {checkpoints.get(uname)}")
+                return 0
+            messages = [msg async for msg in client.iter_messages(entity, min_id=last_id, limit=limit)]
+        except FloodWaitError as error:
+            flood_until[uname] = loop.time() + error.seconds
+            print(f"[REFILL] {channel}: FloodWait {error.seconds} с, канал пропускается")
+            return 0
+        except (ChannelPrivateError, ChannelInvalidError) as error:
+            # Канал закрыт или access_hash устарел — разрешим заново в следующем цикле
+            entity_cache.invalidate(uname)
+            print(f"[REFILL ERROR] {channel}: {error}")
+            return 0
+        except Exception as error:
+            print(f"[REFILL ERROR] {channel}: {error}")
+            return 0
+
+    # Уже поставленные в очередь и обработанные сообщения повторно не ставим
+    messages = [msg for msg in messages if not checkpoints.is_known(uname, msg.id)]
+    for msg in messages:
+        checkpoints.track(uname, msg.id)
+    if catching_up:
+        # Пропуск поставлен в очередь — дальше чекпоинт идёт по нижней границе
+        checkpoints.release(uname)
+    if not messages:
+        return 0
+    refill_ids[uname] = max(refill_ids.get(uname, 0), max(msg.id for msg in messages))
+    print(f"[REFILL] {channel}: в очередь {len(messages)} новых сообщений")
+    # iter_messages отдаёт от новых к старым — в очередь кладём по порядку,
+    # дожидаясь места, чтобы не вытеснять друг друга
+    for msg in reversed(messages):
+        await pipeline.put(msg, uname, priority=PRIORITY_REFILL)
+    return len(messages)
 
 
 async def refill_missed():
     """
     Фоновая задача: дозапрашивает пропущенные сообщения
-    при кратковременных разрывах соединения
+    при кратковременных разрывах соединения.
+    Каналы опрашиваются параллельно (не больше refill_concurrency одновременно).
     """
     await client.connect()
     interval_sec = config.get('refill_interval_seconds', 60)
+    semaphore = asyncio.Semaphore(config.get('refill_concurrency', 8))
 
     while True:
         await asyncio.sleep(interval_sec)
-        total_new = 0
-
-        for channel in config['source_channels']:
-            uname = channel.lstrip('@')
-            try:
-                entity = await client.get_entity(uname)
-                last_id = last_ids.get(uname, 0)
-                new_count = 0
-
-                async for msg in client.iter_messages(entity, min_id=last_id):
-                    await handle_message(msg, uname)
-                    new_count += 1
-
-                if new_count:
-                    print(f"[REFILL] {channel}: обработано {new_count} новых сообщений")
-                total_new += new_count
-
-            except Exception as error:
-                print(f"[REFILL ERROR] {channel}: {error}")
+        counts = await asyncio.gather(
+            *(refill_channel(channel, semaphore) for channel in config['source_channels'])
+        )
+        total_new = sum(counts)
 
         if total_new:
-            print(f"[REFILL] Всего обработано {total_new} новых сообщений за цикл")
+            print(f"[REFILL] Всего поставлено в очередь {total_new} новых сообщений за цикл")
 
 
-async def init_last_ids():
+async def catch_up():
     """
-    Инициализация словаря last_ids: сохраняем ID последнего сообщения
-    для каждого канала при старте бота
+    Старт бота: по сохранённым чекпоинтам дозапрашивает всё, что вышло
+    в каналах за время простоя (не больше catchup_max_messages на канал),
+    и ставит в очередь обработки. Каналы опрашиваются параллельно,
+    как в refill (не больше refill_concurrency одновременно); канал,
+    который не удалось опросить, догоняется в следующем цикле refill.
     """
-    for channel in config['source_channels']:
-        uname = channel.lstrip('@')
-        try:
-            entity = await client.get_entity(uname)
-            messages = await client.get_messages(entity, limit=1)
-            last_ids[uname] = messages[0].id if messages else 0
-            print(f"[INIT] {channel}: last_id = {last_ids[uname]}")
-        except Exception as error:
-            print(f"[INIT ERROR] {channel}: {error}")
-            last_ids[uname] = 0
+    semaphore = asyncio.Semaphore(config.get('refill_concurrency', 8))
+    counts = await asyncio.gather(
+        *(refill_channel(channel, semaphore) for channel in config['source_channels'])
+    )
+    print(f"[INIT] Пропущено за время простоя: {sum(counts)} сообщений поставлено в очередь")
 
 async def daily_cleanup():
     """
-    Каждый день в полночь очищает файл очереди.
+    Каждый день в полночь сворачивает лог дедупликатора на диске в снимок.
+    Сама история не очищается: её размер ограничивает history_size.
     """
-    path = config.get('news_file', 'logs/queue_for_distribution.json')
     while True:
         now = datetime.datetime.now()
         # рассчитываем, сколько секунд до следующей полуночи
@@ -162,13 +252,9 @@ async def daily_cleanup():
         wait_secs = (tomorrow - now).total_seconds()
         await asyncio.sleep(wait_secs)
 
-        # чистим файл
-        try:
-            with open(path, 'w', encoding='utf-8') as f:
-                json.dump([], f, ensure_ascii=False, indent=2)
-            print(f"[CLEANUP] {path} очищен в {tomorrow.date()}")
-        except Exception as e:
-            print(f"[CLEANUP ERROR] Не удалось очистить {path}: {e}")
+        # сворачиваем лог в снимок текущей истории
+        deduper.compact()
+        print(f"[CLEANUP] Лог дедупликатора свёрнут в снимок в {tomorrow.date()}")
         # сразу перейдём к следующей итерации (следующей полуночи)
 
 
@@ -178,8 +264,9 @@ async def poll_parser():
 
     while True:
         entries = await parse()
+        # Записи парсера идут через общую очередь с низким приоритетом
         for e in entries:
-            await handle_entry(e)
+            await pipeline.put(e, priority=PRIORITY_REFILL, handler=handle_entry)
         await asyncio.sleep(interval)
 
 
@@ -187,18 +274,24 @@ async def main():
     """
     Основная функция:
     - запуск сессии пользователя
-    - инициализация last_ids
+    - запуск воркеров очереди и догоняющей загрузки по чекпоинтам
     - запуск фоновых задач refill и batcher
     - ожидание сообщений
     """
+    # До прихода живых сообщений: чекпоинты каналов стоят, пока catch-up не запросит простой
+    checkpoints.hold(channel.lstrip('@') for channel in config['source_channels'])
+
     print("Запускаем сессию пользователя…")
     await client.start(phone=config['phone'])
     print("✅ Сессия пользователя активна")
 
     print(f"[BATCH] Интервал отправки: {interval} мин")
-    await init_last_ids()
 
     # Запуск фоновых тасков
+    await log_sink.start()
+    await checkpoints.start()
+    await pipeline.start()
+    asyncio.create_task(catch_up())
     asyncio.create_task(refill_missed())
     asyncio.create_task(daily_cleanup())
     await batcher.start(client)
@@ -1,22 +1,40 @@
 import os
 import re
 import json
-from sentence_transformers import SentenceTransformer, util
+import glob
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from src.embedding_store import EmbeddingMemo, EmbeddingStore
+from src.history_log import HistoryLog
 
 # Загрузка конфига
 with open('config/config_project.json', 'r', encoding='utf-8-sig') as f:
     cfg = json.load(f)
 
 NEWS_FILE = cfg.get('news_file', 'logs/queue_for_distribution.json')
+# Сколько последних новостей помнить для каждого пользователя
+HISTORY_PER_USER = cfg.get('history_per_user', 100)
+# Через сколько дописанных записей лог сворачивается в новый снимок
+COMPACT_EVERY = cfg.get('compact_every', 500)
 
 
 class Deduplicator:
-    def __init__(self, threshold=0.85, news_file=None):
+    def __init__(self, threshold=0.85, news_file=None, history_per_user=None, compact_every=None):
         self.threshold = threshold
         self.news_file = news_file or NEWS_FILE
+        self.history_per_user = history_per_user or HISTORY_PER_USER
+        self.compact_every = compact_every or COMPACT_EVERY
+        # История на диске: снимок .npy + append-only лог рядом с news_file
+        self.log = HistoryLog(self.news_file)
         self.model = SentenceTransformer('all-MiniLM-L12-v2')
-        self.seen_texts = self._load_existing()
-        print(f"[DEDUP] Загружено {len(self.seen_texts)} старых новостей")
+        self.dim = self.model.get_sentence_embedding_dimension()
+        self.memo = EmbeddingMemo()
+        # История разбита по пользователям: { user_id -> кольцевой буфер }
+        self.histories: dict[int | None, EmbeddingStore] = {}
+        self._load_existing()
+        total = sum(len(store) for store in self.histories.values())
+        print(f"[DEDUP] Загружено {total} старых новостей")
 
     def _preprocess(self, text: str) -> str:
         text = text.lower()
@@ -25,74 +43,139 @@ class Deduplicator:
         text = re.sub(r'\s+', ' ', text)          # удаляем лишние пробелы
         return text.strip()
 
-    def _load_existing(self):
-        if not os.path.exists(self.news_file):
-            print("[DEDUP] Файл не найден, старт с пустого списка")
-            return []
+    def _encode(self, text: str) -> np.ndarray:
+        # Один encode на текст: повторные вызовы берут эмбеддинг из LRU-кэша
+        clean = self._preprocess(text)
+        embedding = self.memo.get(clean)
+        if embedding is None:
+            embedding = self.model.encode(clean)
+            self.memo.put(clean, embedding)
+        return embedding
+
+    def embed_many(self, texts: list[str], batch_size: int = 16) -> list[np.ndarray]:
+        """
+        Считает эмбеддинги для нескольких текстов одним вызовом model.encode.
+        Уже посчитанные тексты берутся из LRU-кэша.
+        """
+        cleaned = [self._preprocess(text) for text in texts]
+        found = {clean: self.memo.get(clean) for clean in cleaned}
+        missing = [clean for clean, vector in found.items() if vector is None]
+        if missing:
+            vectors = self.model.encode(missing, batch_size=batch_size)
+            for clean, vector in zip(missing, vectors):
+                self.memo.put(clean, vector)
+                found[clean] = vector
+        return [found[clean] for clean in cleaned]
+
+    def _history(self, user_id: int = None) -> EmbeddingStore:
+        store = self.histories.get(user_id)
+        if store is None:
+            store = EmbeddingStore(self.history_per_user, self.dim)
+            self.histories[user_id] = store
+        return store
 
+    def _load_existing(self):
         try:
+            if self.log.exists():
+                vectors, metas = self.log.load()
+                for vector, meta in zip(vectors, metas):
+                    self._history(meta.get('user_id')).add(vector, meta.get('text', ''))
+                return
+
+            if not os.path.exists(self.news_file):
+                print("[DEDUP] Файл не найден, старт с пустого списка")
+                return
+
+            # Миграция со старого формата: JSON с текстами и эмбеддингами
             with open(self.news_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                entries = json.load(f)
+            for entry in entries:
+                self._history(entry.get('user_id')).add(entry['embedding'], entry.get('text', ''))
+            self._compact()
         except Exception as e:
             print(f"[DEDUP] Ошибка при загрузке: {e}")
-            return []
-
-    def _save(self):
+            self.histories = {}
+
+    def _compact(self):
+        vectors, metas = [], []
+        for user_id, store in self.histories.items():
+            vectors.append(store.vectors())
+            metas.extend({'text': text, 'user_id': user_id} for text in store.metadata())
+        matrix = np.concatenate(vectors) if vectors else np.zeros((0, self.dim), dtype=np.float32)
+        self.log.compact(matrix, metas)
+
+    def _save(self, embeddings: list[np.ndarray], metas: list[dict]):
+        # Дописываем только новые записи; полная перезапись — раз в compact_every
         try:
-            with open(self.news_file, 'w', encoding='utf-8') as f:
-                json.dump(self.seen_texts, f, ensure_ascii=False, indent=2)
+            self.log.append(np.stack([EmbeddingStore.normalize(e) for e in embeddings]), metas)
+            if self.log.pending >= self.compact_every:
+                self._compact()
         except Exception as e:
             print(f"[DEDUP] Ошибка при сохранении: {e}")
 
-    def get_max_similarity(self, new_text: str, user_id: int = None) -> tuple[float, str | None]:
+    def get_max_similarity(self, new_text: str, user_id: int = None,
+                           embedding: np.ndarray = None) -> tuple[float, str | None]:
         """
         Возвращает (max_sim, best_matching_text) для использования в LLM-арбитре.
+        Сравнение идёт только с историей этого пользователя
+        (при user_id=None — со всеми пользователями).
         Если истории нет — возвращает (0.0, None).
         """
-        if not self.seen_texts:
-            return 0.0, None
+        if user_id is not None:
+            stores = [self.histories[user_id]] if user_id in self.histories else []
+        else:
+            stores = list(self.histories.values())
+        stores = [store for store in stores if len(store)]
 
-        user_history = [
-            entry for entry in self.seen_texts
-            if entry.get('user_id') == user_id
-        ] if user_id is not None else self.seen_texts
-
-        if not user_history:
+        if not stores:
             return 0.0, None
 
-        new_text_clean = self._preprocess(new_text)
-        new_emb = self.model.encode(new_text_clean).tolist()
-
-        recent_entries = user_history[-100:]
-        old_embs = [entry['embedding'] for entry in recent_entries]
-
-        cosine_scores = util.cos_sim([new_emb], old_embs)[0]
-        best_idx = int(cosine_scores.argmax())
-        max_sim = cosine_scores[best_idx].item()
-        best_text = recent_entries[best_idx].get('text', '')
-
-        return max_sim, best_text
+        new_emb = embedding if embedding is not None else self._encode(new_text)
+        return max(
+            (store.max_similarity(new_emb) for store in stores),
+            key=lambda result: result[0]
+        )
 
     def is_duplicate(self, new_text: str, user_id: int = None) -> bool:
         max_sim, _ = self.get_max_similarity(new_text, user_id)
         print(f"[DEDUP] User {user_id} | Макс. сходство: {max_sim:.3f}")
         return max_sim >= self.threshold
 
-    def add(self, new_text: str, user_id: int = None):
-        new_text_clean = self._preprocess(new_text)
-        embedding = self.model.encode(new_text_clean).tolist()
+    def add(self, new_text: str, user_id: int = None, embedding: np.ndarray = None):
+        self.add_many(new_text, [user_id], embedding=embedding)
 
-        self.seen_texts.append({
-            'text': new_text,
-            'embedding': embedding,
-            'user_id': user_id  # Сохраняем ID пользователя
-        })
-        
-        # Ограничиваем историю 1500 записями, чтобы файл не рос бесконечно
-        if len(self.seen_texts) > 1500:
-            self.seen_texts = self.seen_texts[-1500:]
-            
-        self._save()
+    def add_many(self, new_text: str, user_ids, embedding: np.ndarray = None):
+        """
+        Запоминает одну новость сразу для нескольких пользователей
+        (после рассылки): эмбеддинг считается один раз, а строки лога
+        (по одной на пользователя) дописываются одной пачкой.
+        """
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+        if embedding is None:
+            embedding = self._encode(new_text)
+
+        # Буфер пользователя сам вытесняет самые старые записи сверх history_per_user
+        for user_id in user_ids:
+            self._history(user_id).add(embedding, new_text)
+        self._save(
+            [embedding] * len(user_ids),
+            [{'text': new_text, 'user_id': user_id} for user_id in user_ids],
+        )
+
+    def check_and_add(self, new_text: str, user_id: int = None) -> bool:
+        """
+        Проверяет новость на дубликат для пользователя и, если она уникальна,
+        сразу сохраняет её. Возвращает True для дубликата.
+        """
+        embedding = self._encode(new_text)
+        max_sim, _ = self.get_max_similarity(new_text, user_id, embedding=embedding)
+        print(f"[DEDUP] User {user_id} | Макс. сходство: {max_sim:.3f}")
+        if max_sim >= self.threshold:
+            return True
+        self.add(new_text, user_id, embedding=embedding)
+        return False
 
 
 if __name__ == "__main__":
@@ -102,8 +185,8 @@ if __name__ == "__main__":
     cfg['news_file'] = test_file
     NEWS_FILE = test_file
 
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for path in glob.glob(os.path.splitext(test_file)[0] + '.*'):
+        os.remove(path)
 
     dedup = Deduplicator(threshold=0.9)
 
@@ -124,5 +207,5 @@ if __name__ == "__main__":
 
     print("✅ Все тесты прошли успешно.")
 
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for path in glob.glob(os.path.splitext(test_file)[0] + '.*'):
+        os.remove(path)
@@ -0,0 +1,71 @@
+import time
+import asyncio
+import logging
+
+from telethon.errors import FloodWaitError
+
+from src.llm_gateway.rate_limiter import TokenBucketLimiter
+
+logger = logging.getLogger(__name__)
+
+
+class Delivery:
+    """
+    Рассылка одного оффера многим пользователям.
+
+    Сообщения уходят параллельно (до concurrency одновременно), но в
+    пределах лимитов Telegram: общий token bucket — не больше
+    rate_per_second сообщений в секунду на бота, и не чаще раза в
+    chat_interval секунд в один чат (отправки в один чат идут по очереди).
+
+    При FloodWaitError чат ждёт указанное Telegram время и отправка
+    повторяется (до max_flood_retries раз), а общая скорость временно
+    снижается вдвое и затем плавно восстанавливается.
+    """
+
+    def __init__(self, client, rate_per_second: float = 25, chat_interval: float = 1.0,
+                 concurrency: int = 10, max_flood_retries: int = 3):
+        self.client = client
+        self.chat_interval = chat_interval
+        self.max_flood_retries = max_flood_retries
+        self.limiter = TokenBucketLimiter(rpm=rate_per_second * 60, concurrency=concurrency)
+        self._chat_locks: dict[int, asyncio.Lock] = {}
+        self._chat_next: dict[int, float] = {}   # chat_id -> monotonic-время следующей отправки
+
+    async def send_many(self, user_ids, text: str, **kwargs) -> list[int]:
+        """Отправляет text всем user_ids. Возвращает тех, кому сообщение доставлено."""
+        user_ids = list(user_ids)
+        results = await asyncio.gather(
+            *(self._send(uid, text, kwargs) for uid in user_ids),
+            return_exceptions=True,
+        )
+        delivered = []
+        for uid, result in zip(user_ids, results):
+            if isinstance(result, BaseException):
+                logger.error(f"Ошибка отправки пользователю {uid}: {result}")
+            else:
+                delivered.append(uid)
+        return delivered
+
+    async def _send(self, chat_id: int, text: str, kwargs: dict):
+        lock = self._chat_locks.setdefault(chat_id, asyncio.Lock())
+        async with lock:
+            for attempt in range(self.max_flood_retries + 1):
+                delay = self._chat_next.get(chat_id, 0.0) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                try:
+                    async with self.limiter.slot():
+                        result = await self.client.send_message(chat_id, text, **kwargs)
+                    self.limiter.on_success()
+                    self._chat_next[chat_id] = time.monotonic() + self.chat_interval
+                    return result
+                except FloodWaitError as e:
+                    self._chat_next[chat_id] = time.monotonic() + e.seconds
+                    self.limiter.on_rate_limited(0, 0)
+                    if attempt >= self.max_flood_retries:
+                        raise
+                    logger.warning(
+                        f"[DELIVERY] FloodWait {e.seconds} с для {chat_id}, "
+                        f"повтор {attempt + 1}/{self.max_flood_retries}"
+                    )
@@ -10,6 +10,8 @@ from telethon import TelegramClient, events
 from newsendingbot.offer_generator import generate_offer_async
 from newsendingbot.process_logging import log_news_process
 from newsendingbot.deduplicator import Deduplicator
+from newsendingbot.delivery import Delivery
+from src.entity_cache import EntityCache
 
 # --- НАСТРОЙКИ ---
 CONFIG_PATH = Path(__file__).resolve().parent.parent / "config" / "config.json"
@@ -307,6 +309,8 @@ def build_flexible_other_regions_pattern(regions_list):
         if not n:
             continue
         for part in n.split():
+            if not re.search(r"[а-яё]", part):
+                continue  # «-» из «... округ - Югра» совпадал с любым словом через дефис
             if len(part) > 4:
                 roots.add(re.escape(part[:6]))
             else:
@@ -315,40 +319,57 @@ def build_flexible_other_regions_pattern(regions_list):
     pattern = rf"\b(?:{alternation})[а-яё\-]{{0,5}}\b"
     return re.compile(pattern, flags=re.IGNORECASE)
 
-OTHER_REGIONS_PATTERN = build_flexible_other_regions_pattern(OTHER_REGIONS_LIST)
+# --- Паттерны регионов ДФО ---
+REGION_PATTERNS = {
+    "Хабаровский край": r"\b(?:хабаровск(?:\w{0,7})|хабаровск(?:\w{0,7})?\s*кра(?:\w{0,4})|комсомольск(?:\w{0,7})?[-\s]?на[-\s]?амуре|николаевск(?:\w{0,7})?[-\s]?на[-\s]?амуре|советск(?:\w{0,7})\sгаван(?:\w{0,7}))\b",
+    "Приморский край": r"\b(?:приморск(?:ий|\w{0,7})?|приморь(?:е|\w{0,7})?|владивосток(?:\w{0,7})|уссурийск(?:\w{0,7})|находк(?:\w{0,7})?|арсеньев(?:\w{0,7})|артем(?:\w{0,7})|лесозаводск(?:\w{0,7}))\b",
+    "Сахалинская область": r"\b(?:сахалин(?:\w{0,7})|южно[-\s]?сахалинск(?:\w{0,7})|корсаков(?:\w{0,7})|холмск(?:\w{0,7})|остров(?:а\s+курильск(?:ие|их))?)\b",
+    "Еврейская автономная область": r"\b(?:евре(?:йск(?:\w{0,7})?\s+автономн(?:\w{0,7})?(?:\s+область|)|еврейская\s+ао)|биробиджан(?:\w{0,7})|облучье(?:\w{0,7})|EАО)\b",
+    "Амурская область": r"\b(?:амурск(?:ая|ой|ую|ом|\w{0,5})?|благовещенск(?:\w{0,7})|свободный(?:\w{0,7})|тында(?:\w{0,7})|зея(?:\w{0,7})|шимановск(?:\w{0,7}))\b",
+    "Чукотский автономный округ": r"\b(?:чукотск(?:\w{0,7})?|чукотка(?:\w{0,7})|анадыр(?:ь|е|я)?|певек(?:\w{0,7})|беринговск(?:\w{0,7}))\b",
+    "Магаданская область": r"\b(?:магадан(?:\w{0,7})|магаданск(?:\w{0,7})?|сеяха(?:\w{0,7}))\b",
+    "Камчатский край": r"\b(?:камчатск(?:\w{0,7})?|петропавловск[-\s]?камчатск(?:\w{0,7})?|елизово(?:\w{0,7}))\b",
+}
 
-def detect_other_regions(text: str):
+def build_region_matcher(region_patterns: dict, other_pattern: str):
+    """
+    Все регионы в одной регулярке: именованная группа на каждый регион ДФО
+    и группа other для прочих регионов. Регионы ДФО стоят в альтернации
+    раньше, поэтому при совпадении в одной позиции выигрывают они.
+    Общий для всех вариантов \\b вынесен наружу как «начало слова», чтобы
+    альтернация перебиралась только в началах слов.
+    """
+    word_start = r"\b"
+    groups = [
+        f"(?P<r{i}>{pattern.removeprefix(word_start)})"
+        for i, pattern in enumerate(region_patterns.values())
+    ]
+    groups.append(f"(?P<other>{other_pattern.removeprefix(word_start)})")
+    return re.compile(r"(?<!\w)(?=\w)(?:" + "|".join(groups) + ")", flags=re.IGNORECASE)
+
+REGION_GROUPS = {f"r{i}": region for i, region in enumerate(REGION_PATTERNS)}
+REGION_MATCHER = build_region_matcher(
+    REGION_PATTERNS,
+    build_flexible_other_regions_pattern(OTHER_REGIONS_LIST).pattern,
+)
+
+def scan_regions(text: str) -> tuple[List[str], List[str]]:
+    """Один проход по тексту: (регионы ДФО, упоминания прочих регионов)."""
     if not text:
-        return []
-    found = set()
-    for m in OTHER_REGIONS_PATTERN.finditer(text):
-        found.add(m.group(0))
-    return list(found)
+        return [], []
+    regions_found, others_found = set(), set()
+    for m in REGION_MATCHER.finditer(text):
+        if m.lastgroup == "other":
+            others_found.add(m.group(0))
+        else:
+            regions_found.add(REGION_GROUPS[m.lastgroup])
+    return list(regions_found), list(others_found)
+
+def detect_other_regions(text: str):
+    return scan_regions(text)[1]
 
 def detect_regions(text: str) -> List[str]:
-    if not text:
-        return []
-    regions_found = set()
-    t = text.lower()
-    patterns = {
-        "Хабаровский край": r"\b(?:хабаровск(?:\w{0,7})|хабаровск(?:\w{0,7})?\s*кра(?:\w{0,4})|комсомольск(?:\w{0,7})?[-\s]?на[-\s]?амуре|николаевск(?:\w{0,7})?[-\s]?на[-\s]?амуре|советск(?:\w{0,7})\sгаван(?:\w{0,7}))\b",
-        "Приморский край": r"\b(?:приморск(?:ий|\w{0,7})?|приморь(?:е|\w{0,7})?|владивосток(?:\w{0,7})|уссурийск(?:\w{0,7})|находк(?:\w{0,7})?|арсеньев(?:\w{0,7})|артем(?:\w{0,7})|лесозаводск(?:\w{0,7}))\b",
-        "Сахалинская область": r"\b(?:сахалин(?:\w{0,7})|южно[-\s]?сахалинск(?:\w{0,7})|корсаков(?:\w{0,7})|холмск(?:\w{0,7})|остров(?:а\s+курильск(?:ие|их))?)\b",
-        "Еврейская автономная область": r"\b(?:евре(?:йск(?:\w{0,7})?\s+автономн(?:\w{0,7})?(?:\s+область|)|еврейская\s+ао)|биробиджан(?:\w{0,7})|облучье(?:\w{0,7})|EАО)\b",
-        "Амурская область": r"\b(?:амурск(?:ая|ой|ую|ом|\w{0,5})?|благовещенск(?:\w{0,7})|свободный(?:\w{0,7})|тында(?:\w{0,7})|зея(?:\w{0,7})|шимановск(?:\w{0,7}))\b",
-        "Чукотский автономный округ": r"\b(?:чукотск(?:\w{0,7})?|чукотка(?:\w{0,7})|анадыр(?:ь|е|я)?|певек(?:\w{0,7})|беринговск(?:\w{0,7}))\b",
-        "Камчатский край": r"\b(?:камчатск(?:\w{0,7})?|петропавловск[-\s]?камчатск(?:\w{0,7})?|елизово(?:\w{0,7})|магаданск(?:\w{0,7})?)\b",
-        "Магаданская область": r"\b(?:магадан(?:\w{0,7})|магаданск(?:\w{0,7})?|сеяха(?:\w{0,7}))\b"
-    }
-    for region, pat in patterns.items():
-        try:
-            regex = re.compile(pat, flags=re.IGNORECASE | re.VERBOSE)
-            if regex.search(t):
-                regions_found.add(region)
-        except re.error:
-            if region.lower().split()[0] in t:
-                regions_found.add(region)
-    return list(regions_found)
+    return scan_regions(text)[0]
 
 # Логирование
 logging.basicConfig(
@@ -361,6 +382,17 @@ logger = logging.getLogger(__name__)
 SESSION_NAME = str(Path(__file__).resolve().parent / "newsendingbot_session")
 client = TelegramClient(SESSION_NAME, API_ID, API_HASH)
 
+# Рассылка офферов: параллельно, в пределах общего и per-chat лимитов Telegram
+delivery = Delivery(
+    client,
+    rate_per_second=cfg.get('delivery_rate_per_second', 25),
+    chat_interval=cfg.get('delivery_chat_interval_seconds', 1.0),
+    concurrency=cfg.get('delivery_concurrency', 10),
+)
+
+# Кэш каналов (peer id → username): без сетевого get_chat после перезапуска
+entity_cache = EntityCache(str(Path(__file__).resolve().parent / "entity_cache.json"))
+
 # Множество для хранения ID обработанных сообщений
 processed_messages = set()
 
@@ -370,8 +402,11 @@ async def handle_new_message(event):
         if not event.is_channel:
             return
             
-        sender = await event.get_chat()
-        channel_username = getattr(sender, 'username', None)
+        if event.chat is not None:
+            sender = entity_cache.remember(event.chat)  # заметит смену username
+        else:
+            sender = await entity_cache.get_info(client, event.chat_id)
+        channel_username = sender.get('username')
         channel_key = f"@{channel_username}" if channel_username else None
         
         if channel_key and channel_key not in CHANNELS:
@@ -400,9 +435,12 @@ async def handle_new_message(event):
             if block.strip()
         ]  
 
-        for news in news_blocks:
-            regions = detect_regions(news) 
-            other_regions = detect_other_regions(news)
+        # Эмбеддинги всех блоков считаем одним batch-вызовом модели,
+        # дальше для каждого получателя — только сравнение векторов
+        embeddings = deduplicator.embed_many(news_blocks)
+
+        for news, news_emb in zip(news_blocks, embeddings):
+            regions, other_regions = scan_regions(news)
 
             if not regions and other_regions:
                 logger.info("Новость содержит прочие регионы — пропускаем.")
@@ -439,7 +477,7 @@ async def handle_new_message(event):
                     continue
                 
                 # Уровни 2-4: семантическая + LLM
-                max_sim, best_text = deduplicator.get_max_similarity(news, user_id=uid)
+                max_sim, best_text = deduplicator.get_max_similarity(news, user_id=uid, embedding=news_emb)
                 logger.info(f"[DEDUP] User {uid} | Сходство: {max_sim:.3f}")
                 
                 if max_sim >= DEDUP_HIGH:
@@ -470,17 +508,14 @@ async def handle_new_message(event):
             # Рассылаем один и тот же оффер всем подходящим пользователям
             region_str = ", ".join(regions) if regions else "Не определен"
             
-            for uid in actual_recipients:
-                try:
-                    await client.send_message(uid, offer, parse_mode='html')
-                    # Помечаем в семантическом дедубликаторе
-                    deduplicator.add(news, user_id=uid)
-                    # Помечаем URL как отправленный этому пользователю
-                    if news_url:
-                        url_sent_to_user.setdefault(uid, set()).add(news_url)
-                    logger.info(f"Оффер отправлен пользователю {uid}")
-                except Exception as e:
-                    logger.error(f"Ошибка отправки пользователю {uid}: {e}")
+            delivered = await delivery.send_many(actual_recipients, offer, parse_mode='html')
+            # Помечаем в семантическом дедубликаторе — одной записью на всех получателей
+            deduplicator.add_many(news, delivered, embedding=news_emb)
+            for uid in delivered:
+                # Помечаем URL как отправленный этому пользователю
+                if news_url:
+                    url_sent_to_user.setdefault(uid, set()).add(news_url)
+                logger.info(f"Оффер отправлен пользователю {uid}")
 
             # Логируем процесс один раз для всей группы
             try:
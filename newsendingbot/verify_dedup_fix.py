@@ -1,12 +1,13 @@
 
 import os
+import glob
 import shutil
 from newsendingbot.deduplicator import Deduplicator
 
 TEST_FILE = "newsendingbot/test_dedup_storage.json"
 
-if os.path.exists(TEST_FILE):
-    os.remove(TEST_FILE)
+for path in glob.glob(os.path.splitext(TEST_FILE)[0] + '.*'):
+    os.remove(path)
 
 print("Starting Deduplication Logic Verification...")
 
@@ -48,5 +49,5 @@ assert is_dup_b_2
 print("\nALL TESTS PASSED! Deduplication is now user-specific.")
 
 # Cleanup
-if os.path.exists(TEST_FILE):
-    os.remove(TEST_FILE)
+for path in glob.glob(os.path.splitext(TEST_FILE)[0] + '.*'):
+    os.remove(path)
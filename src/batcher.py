@@ -1,84 +1,180 @@
+import os
 import json
+import heapq
 import asyncio
+import itertools
 from datetime import datetime
 
+from src.send_queue import SendQueue, pack_messages
+
 PENDING_FILE = 'logs/pending_news.json'
+JOURNAL_FILE = 'logs/pending_news.journal.jsonl'
+
+DIGEST_HEADER = "🔥 Топ новостей за последнее время:\n\n"
+DIGEST_SEPARATOR = "\n\n──────────\n\n"
 
 class Batcher:
-    def __init__(self, interval_minutes: int = 10, max_per_batch: int | None = None):
+    """
+    Очередь новостей на отправку с периодической рассылкой топа по каналам.
+
+    Для каждого целевого канала держится min-куча не больше max_per_batch
+    записей по ключу (engagement, -seq): новость, не попадающая в топ,
+    отбрасывается сразу при add, а точные дубликаты текста не добавляются.
+    Память и работа при отправке — O(каналы · max_per_batch) независимо
+    от числа входящих новостей.
+
+    Очередь переживает перезапуск: каждое добавление дописывается одной
+    строкой в журнал (JOURNAL_FILE), а снимок всей очереди (PENDING_FILE,
+    {"seq": ..., "pending": [...]}) атомарно переписывается только при
+    отправке батча или раз в compact_every добавлений. При старте к снимку
+    применяются записи журнала с seq больше сохранённого в снимке.
+
+    Дайджест раскладывается по сообщениям целыми новостями в пределах
+    лимита Telegram и уходит через общую очередь отправки (SendQueue).
+    """
+
+    def __init__(self, interval_minutes: int = 10, max_per_batch: int | None = None, compact_every: int = 200,
+                 send_interval: float = 1.0):
         self.interval = interval_minutes * 60
         self.max_per_batch = max_per_batch
+        self.compact_every = compact_every
+        self.send_interval = send_interval
+        self.seq = 0             # номер последнего добавления
+        self._journaled = 0      # записей в журнале после снимка
+        self._order = itertools.count()   # разрешает равенство ключей в куче
+        self.heaps: dict[str, list] = {}  # target -> [(engagement, -seq, -order, entry)]
+        self.texts: dict[str, set] = {}   # target -> тексты в куче
+        for entry in self._load():
+            self._insert(entry)
+
+    @property
+    def pending(self) -> list[dict]:
+        """Все записи в очереди (по всем каналам)."""
+        return [item[-1] for heap in self.heaps.values() for item in heap]
+
+    def _load(self) -> list[dict]:
         try:
             with open(PENDING_FILE, 'r', encoding='utf-8-sig') as f:
-                self.pending = json.load(f)
+                snapshot = json.load(f)
         except Exception:
-            self.pending = []
+            snapshot = []
+        if isinstance(snapshot, list):
+            # Старый формат — просто список записей
+            snapshot = {"seq": 0, "pending": snapshot}
+        pending = snapshot.get("pending", [])
+        self.seq = snapshot.get("seq", 0)
+
+        replayed = 0
+        if os.path.exists(JOURNAL_FILE):
+            valid_size = 0  # конец последней целой строки
+            with open(JOURNAL_FILE, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break  # недописанная строка после падения
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        break
+                    valid_size += len(line)
+                    if entry.get("seq", 0) <= self.seq:
+                        continue  # уже вошла в снимок
+                    pending.append(entry)
+                    self.seq = entry["seq"]
+                    replayed += 1
+            # Отрезаем хвост, иначе следующая запись допишется в ту же строку
+            if os.path.getsize(JOURNAL_FILE) != valid_size:
+                with open(JOURNAL_FILE, 'r+b') as f:
+                    f.truncate(valid_size)
+        if replayed:
+            print(f"[BATCHER] Восстановлено из журнала: {replayed}")
+            self._journaled = replayed
+        return pending
+
+    def _insert(self, entry: dict) -> bool:
+        """Кладёт запись в кучу её канала. False — дубликат или не проходит в топ."""
+        target = entry["target"]
+        texts = self.texts.setdefault(target, set())
+        if entry["text"] in texts:
+            return False
+
+        heap = self.heaps.setdefault(target, [])
+        item = (entry.get("engagement", 5), -entry.get("seq", 0), -next(self._order), entry)
+        if self.max_per_batch is None or len(heap) < self.max_per_batch:
+            heapq.heappush(heap, item)
+        elif item[:3] > heap[0][:3]:
+            # Вытесняем самую слабую (при равной оценке — самую новую) запись
+            evicted = heapq.heapreplace(heap, item)
+            texts.discard(evicted[-1]["text"])
+        else:
+            return False
+        texts.add(entry["text"])
+        return True
 
     async def start(self, client):
         self.client = client
+        self.sender = SendQueue(client, interval=self.send_interval)
+        self.sender.start()
         asyncio.create_task(self._periodic_send())
 
     async def _periodic_send(self):
         while True:
             await asyncio.sleep(self.interval)
-            if not self.pending:
+            if not self.heaps:
                 continue
 
-            # Группировка по целевым каналам
-            grouped: dict[str, list[dict]] = {}
-            for entry in self.pending:
-                grouped.setdefault(entry["target"], []).append(entry)
-
             # Сброс текущей очереди сразу, чтобы не дублировать при ошибке
-            self.pending = []
-            self._save()
-
-            for target, messages in grouped.items():
-                try:
-                    # Сортировка по интересности
-                    sorted_msgs = sorted(
-                        messages,
-                        key=lambda x: x.get("engagement", 5),
-                        reverse=True
-                    )
-                    # Отбираем только top-N
-                    if self.max_per_batch is not None:
-                        sorted_msgs = sorted_msgs[: self.max_per_batch]
-
-                    # Убираем дубликаты текста
-                    seen_texts = set()
-                    unique_parts = []
-                    for msg in sorted_msgs:
-                        txt = msg['text']
-                        if txt not in seen_texts:
-                            seen_texts.add(txt)
-                            unique_parts.append(txt)
-
-                    # Финальный текст
-                    header = "🔥 Топ новостей за последнее время:\n\n"
-                    full_text = header + "\n\n──────────\n\n".join(unique_parts)
-
-                    await self.client.send_message(target, full_text[:4090], link_preview=False)
-
-                except Exception as e:
-                    print(f"[BATCHER] Ошибка при отправке: {e}")
-                    self.pending.extend(messages)
-
-            self._save()
+            grouped, self.heaps, self.texts = self.heaps, {}, {}
+            self._snapshot()
+
+            for target, heap in grouped.items():
+                # Сортировка по интересности (при равной — в порядке поступления)
+                messages = [item[-1] for item in sorted(heap, key=lambda x: x[:3], reverse=True)]
+                # Новости не режутся посередине: не влезшие уходят следующим сообщением
+                chunks = pack_messages([msg['text'] for msg in messages], DIGEST_HEADER, DIGEST_SEPARATOR)
+                for text, indexes in chunks:
+                    try:
+                        await self.sender.send(target, text, link_preview=False)
+                    except Exception as e:
+                        print(f"[BATCHER] Ошибка при отправке: {e}")
+                        for i in indexes:
+                            self._insert(messages[i])
+
+            self._snapshot()
 
     def add(self, text: str, target: str, engagement: int):
         if engagement < 5:
             return  # 🔴 Игнорируем неинтересные сообщения
 
+        self.seq += 1
         entry = {
+            "seq": self.seq,
             "text": text,
             "target": target,
             "ts": datetime.now().isoformat(),
             "engagement": engagement
         }
-        self.pending.append(entry)
-        self._save()
+        if self._insert(entry):
+            self._append(entry)
+
+    def _append(self, entry: dict):
+        # Дозапись одной строки вместо перезаписи всей очереди
+        os.makedirs(os.path.dirname(JOURNAL_FILE) or '.', exist_ok=True)
+        with open(JOURNAL_FILE, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._journaled += 1
+        if self._journaled >= self.compact_every:
+            self._snapshot()
 
-    def _save(self):
-        with open(PENDING_FILE, 'w', encoding='utf-8') as f:
-            json.dump(self.pending, f, ensure_ascii=False, indent=2)
\ No newline at end of file
+    def _snapshot(self):
+        """Атомарно записывает снимок очереди и обнуляет журнал."""
+        os.makedirs(os.path.dirname(PENDING_FILE) or '.', exist_ok=True)
+        tmp = PENDING_FILE + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({"seq": self.seq, "pending": self.pending}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, PENDING_FILE)
+        # Если упадём до обрезки — записи журнала с seq <= снимка будут пропущены
+        with open(JOURNAL_FILE, 'w', encoding='utf-8'):
+            pass
+        self._journaled = 0
@@ -0,0 +1,140 @@
+import os
+import json
+import atexit
+import asyncio
+
+
+class CheckpointStore:
+    """
+    Персистентные чекпоинты каналов: имя канала → ID, до которого
+    (включительно) все поставленные в очередь сообщения обработаны.
+
+    Воркеры завершают сообщения не по порядку, поэтому чекпоинт — нижняя
+    граница: track() регистрирует сообщение при постановке в очередь,
+    complete() — после обработки, drop() — если очередь его вытеснила
+    (refill запросит его снова, см. refetch_from). Сообщение, обработка
+    которого упала (fail), тоже дозапрашивается refill'ом и держит
+    чекпоинт; после max_retries неудачных попыток оно пропускается.
+
+    Пока канал удержан (hold — до конца догоняющей загрузки после старта),
+    его чекпоинт не двигается: иначе обработанное живое сообщение сдвинуло
+    бы его через ещё не запрошенный пропуск за время простоя.
+
+    Изменения копятся в памяти; на диск они сбрасываются пачкой раз в
+    flush_seconds (и при выходе) атомарной перезаписью файла, так что
+    после падения файл всегда целый.
+    """
+
+    def __init__(self, path: str, flush_seconds: float = 10, max_retries: int = 3):
+        self.path = path
+        self.flush_seconds = flush_seconds
+        self.max_retries = max_retries
+        self.ids: dict[str, int] = {}
+        self._dirty = False
+        # Только в памяти: ID сообщений выше чекпоинта по каналам
+        self._unfinished: dict[str, set[int]] = {}   # в очереди / в обработке
+        self._missing: dict[str, set[int]] = {}      # вытеснены из очереди или упали, ждут refill
+        self._failures: dict[str, dict[int, int]] = {}   # неудачные попытки обработки
+        self._completed: dict[str, set[int]] = {}    # обработаны, но чекпоинт до них не дошёл
+        self._held: set[str] = set()                 # каналы, ещё не догнавшие простой
+        if os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    self.ids = {k: int(v) for k, v in json.load(f).items()}
+            except (OSError, ValueError) as e:
+                print(f"[CHECKPOINTS] Не удалось прочитать {path}: {e}")
+        atexit.register(self.flush)
+
+    def get(self, channel: str) -> int:
+        return self.ids.get(channel, 0)
+
+    def mark(self, channel: str, msg_id: int):
+        """Ставит чекпоинт напрямую (новый канал); чекпоинт только растёт."""
+        if msg_id > self.ids.get(channel, 0):
+            self.ids[channel] = msg_id
+            self._dirty = True
+
+    def track(self, channel: str, msg_id: int):
+        self._unfinished.setdefault(channel, set()).add(msg_id)
+        self._missing.get(channel, set()).discard(msg_id)
+
+    def complete(self, channel: str, msg_id: int):
+        self._unfinished.get(channel, set()).discard(msg_id)
+        self._failures.get(channel, {}).pop(msg_id, None)
+        if msg_id > self.get(channel):
+            self._completed.setdefault(channel, set()).add(msg_id)
+        self._advance(channel)
+
+    def drop(self, channel: str, msg_id: int):
+        self._unfinished.get(channel, set()).discard(msg_id)
+        self._missing.setdefault(channel, set()).add(msg_id)
+
+    def fail(self, channel: str, msg_id: int) -> bool:
+        """
+        Обработка упала. True — сообщение будет дозапрошено refill'ом,
+        False — попытки исчерпаны, и оно считается завершённым.
+        """
+        failures = self._failures.setdefault(channel, {})
+        failures[msg_id] = failures.get(msg_id, 0) + 1
+        if failures[msg_id] > self.max_retries:
+            self.complete(channel, msg_id)
+            return False
+        self.drop(channel, msg_id)
+        return True
+
+    def is_known(self, channel: str, msg_id: int) -> bool:
+        """Сообщение уже в очереди, в обработке или обработано — ставить его повторно не нужно."""
+        return msg_id in self._unfinished.get(channel, ()) or msg_id in self._completed.get(channel, ())
+
+    def refetch_from(self, channel: str) -> int | None:
+        """ID, после которого нужно дозапросить вытесненные сообщения (None — таких нет)."""
+        missing = self._missing.get(channel)
+        return min(missing) - 1 if missing else None
+
+    def hold(self, channels):
+        self._held.update(channels)
+
+    def release(self, channel: str):
+        self._held.discard(channel)
+        self._advance(channel)
+
+    def is_held(self, channel: str) -> bool:
+        return channel in self._held
+
+    def _advance(self, channel: str):
+        completed = self._completed.get(channel)
+        if not completed or channel in self._held:
+            return
+        # Нижняя граница: не дальше последнего обработанного и не дальше первого незавершённого
+        watermark = max(completed)
+        pending = self._unfinished.get(channel, set()) | self._missing.get(channel, set())
+        if pending:
+            watermark = min(watermark, min(pending) - 1)
+        self.mark(channel, watermark)
+        self._completed[channel] = {i for i in completed if i > self.get(channel)}
+
+    async def start(self):
+        asyncio.create_task(self._periodic_flush())
+
+    async def _periodic_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            self.flush()
+
+    def flush(self):
+        if not self._dirty:
+            return
+        self._dirty = False
+        try:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            tmp = self.path + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.ids, f, ensure_ascii=False, indent=2)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+        except Exception as e:
+            self._dirty = True
+            print(f"[CHECKPOINTS] Ошибка записи {self.path}: {e}")
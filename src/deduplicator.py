@@ -1,22 +1,34 @@
 import os
 import re
 import json
-from sentence_transformers import SentenceTransformer, util
+import glob
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from src.embedding_store import EmbeddingMemo, EmbeddingStore
+from src.history_log import HistoryLog
 
 # Загрузка конфига
 with open('config/config_project.json', 'r', encoding='utf-8-sig') as f:
     cfg = json.load(f)
 
 NEWS_FILE = cfg.get('news_file', 'logs/queue_for_distribution.json')
+# Через сколько дописанных записей лог сворачивается в новый снимок
+COMPACT_EVERY = cfg.get('compact_every', 500)
 
 
 class Deduplicator:
-    def __init__(self, threshold=0.85, news_file=None):
+    def __init__(self, threshold=0.85, news_file=None, history_size=1000, compact_every=None):
         self.threshold = threshold
         self.news_file = news_file or NEWS_FILE
+        self.compact_every = compact_every or COMPACT_EVERY
+        # История на диске: снимок .npy + append-only лог рядом с news_file
+        self.log = HistoryLog(self.news_file)
         self.model = SentenceTransformer('all-MiniLM-L12-v2')
-        self.seen_texts = self._load_existing()
-        print(f"[DEDUP] Загружено {len(self.seen_texts)} старых новостей")
+        self.store = EmbeddingStore(history_size, self.model.get_sentence_embedding_dimension())
+        self.memo = EmbeddingMemo()
+        self._load_existing()
+        print(f"[DEDUP] Загружено {len(self.store)} старых новостей")
 
     def _preprocess(self, text: str) -> str:
         text = text.lower()
@@ -25,51 +37,96 @@ class Deduplicator:
         text = re.sub(r'\s+', ' ', text)          # удаляем лишние пробелы
         return text.strip()
 
-    def _load_existing(self):
-        if not os.path.exists(self.news_file):
-            print("[DEDUP] Файл не найден, старт с пустого списка")
-            return []
+    def _encode(self, text: str) -> np.ndarray:
+        # Один encode на текст: повторные вызовы берут эмбеддинг из LRU-кэша
+        clean = self._preprocess(text)
+        embedding = self.memo.get(clean)
+        if embedding is None:
+            embedding = self.model.encode(clean)
+            self.memo.put(clean, embedding)
+        return embedding
 
+    def _load_existing(self):
         try:
+            if self.log.exists():
+                vectors, metas = self.log.load()
+                for vector, meta in zip(vectors, metas):
+                    self.store.add(vector, meta['text'])
+                return
+
+            if not os.path.exists(self.news_file):
+                print("[DEDUP] Файл не найден, старт с пустого списка")
+                return
+
+            # Миграция со старого формата: JSON с текстами (+ векторы в JSON или в .npy)
             with open(self.news_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+                entries = json.load(f)
+
+            legacy_vectors_file = os.path.splitext(self.news_file)[0] + '.npy'
+            if entries and 'embedding' in entries[0]:
+                vectors = [entry['embedding'] for entry in entries]
+            elif os.path.exists(legacy_vectors_file):
+                vectors = np.load(legacy_vectors_file)
+            else:
+                vectors = []
+
+            # Тексты и векторы сопоставляются с конца (самые свежие записи)
+            count = min(len(entries), len(vectors), self.store.capacity)
+            for i in range(-count, 0):
+                self.store.add(vectors[i], entries[i]['text'])
+            self._compact()
         except Exception as e:
             print(f"[DEDUP] Ошибка при загрузке: {e}")
-            return []
+            self.store.clear()
+
+    def _compact(self):
+        self.log.compact(self.store.vectors(), [{'text': text} for text in self.store.metadata()])
 
-    def _save(self):
+    def _save(self, embedding: np.ndarray, text: str):
+        # Дописываем только новую запись; полная перезапись — раз в compact_every
         try:
-            with open(self.news_file, 'w', encoding='utf-8') as f:
-                json.dump(self.seen_texts, f, ensure_ascii=False, indent=2)
+            self.log.append(self.store.normalize(embedding), [{'text': text}])
+            if self.log.pending >= self.compact_every:
+                self._compact()
         except Exception as e:
             print(f"[DEDUP] Ошибка при сохранении: {e}")
 
-    def is_duplicate(self, new_text: str) -> bool:
-        if not self.seen_texts:
-            return False
-
-        new_text_clean = self._preprocess(new_text)
-        new_emb = self.model.encode(new_text_clean).tolist()
+    def compact(self):
+        """Сворачивает лог на диске в снимок текущей истории (история в памяти не меняется)."""
+        try:
+            self._compact()
+        except Exception as e:
+            print(f"[DEDUP] Ошибка при сворачивании лога: {e}")
 
-        # Сравнение только с последними 100 новостями
-        recent_entries = self.seen_texts[-1000:]
-        old_embs = [entry['embedding'] for entry in recent_entries]
+    def _is_duplicate_embedding(self, embedding: np.ndarray) -> bool:
+        if not len(self.store):
+            return False
 
-        cosine_scores = util.cos_sim([new_emb], old_embs)[0]
-        max_sim = max(cosine_scores).item()
+        # Сравнение с последними history_size новостями в кольцевом буфере
+        max_sim, _ = self.store.max_similarity(embedding)
 
         print(f"[DEDUP] Макс. сходство: {max_sim:.3f}")
         return max_sim >= self.threshold
 
-    def add(self, new_text: str):
-        new_text_clean = self._preprocess(new_text)
-        embedding = self.model.encode(new_text_clean).tolist()
+    def is_duplicate(self, new_text: str) -> bool:
+        return self._is_duplicate_embedding(self._encode(new_text))
 
-        self.seen_texts.append({
-            'text': new_text,
-            'embedding': embedding
-        })
-        self._save()
+    def add(self, new_text: str):
+        embedding = self._encode(new_text)
+        self.store.add(embedding, new_text)
+        self._save(embedding, new_text)
+
+    def check_and_add(self, new_text: str) -> bool:
+        """
+        Проверяет новость на дубликат и, если она уникальна, сразу сохраняет её.
+        Возвращает True для дубликата. Эмбеддинг считается один раз.
+        """
+        embedding = self._encode(new_text)
+        if self._is_duplicate_embedding(embedding):
+            return True
+        self.store.add(embedding, new_text)
+        self._save(embedding, new_text)
+        return False
 
 
 if __name__ == "__main__":
@@ -79,8 +136,8 @@ if __name__ == "__main__":
     cfg['news_file'] = test_file
     NEWS_FILE = test_file
 
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for path in glob.glob(os.path.splitext(test_file)[0] + '.*'):
+        os.remove(path)
 
     dedup = Deduplicator(threshold=0.9)
 
@@ -101,5 +158,5 @@ if __name__ == "__main__":
 
     print("✅ Все тесты прошли успешно.")
 
-    if os.path.exists(test_file):
-        os.remove(test_file)
+    for path in glob.glob(os.path.splitext(test_file)[0] + '.*'):
+        os.remove(path)
@@ -0,0 +1,100 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
+
+
+class EmbeddingStore:
+    """
+    Кольцевой буфер эмбеддингов в памяти.
+
+    Векторы хранятся в заранее выделенной матрице float32 и нормируются
+    при добавлении, поэтому косинусное сходство сводится к одному
+    матрично-векторному произведению. Метаданные (текст и т.п.) лежат
+    отдельным списком параллельно строкам матрицы.
+    """
+
+    def __init__(self, capacity: int, dim: int):
+        self.capacity = capacity
+        self.dim = dim
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._meta: list = [None] * capacity
+        self._next = 0   # индекс следующей записи
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @staticmethod
+    def normalize(vector) -> np.ndarray:
+        vec = np.asarray(vector, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(vec)
+        return vec / norm if norm > 0 else vec
+
+    def add(self, vector, meta=None):
+        """Добавляет вектор за O(1), вытесняя самую старую запись при переполнении."""
+        self._vectors[self._next] = self.normalize(vector)
+        self._meta[self._next] = meta
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def max_similarity(self, vector) -> tuple[float, object]:
+        """
+        Возвращает (max_sim, meta) для ближайшего сохранённого вектора.
+        Если буфер пуст — (0.0, None).
+        """
+        if not self._size:
+            return 0.0, None
+
+        scores = self._vectors[:self._size] @ self.normalize(vector)
+        best_idx = int(scores.argmax())
+        return float(scores[best_idx]), self._meta[best_idx]
+
+    def _order(self) -> list[int]:
+        # Индексы строк от самой старой записи к самой новой
+        start = self._next if self._size == self.capacity else 0
+        return [(start + i) % self.capacity for i in range(self._size)]
+
+    def vectors(self) -> np.ndarray:
+        """Копия сохранённых векторов в порядке добавления."""
+        return self._vectors[self._order()]
+
+    def metadata(self) -> list:
+        """Метаданные в порядке добавления."""
+        return [self._meta[i] for i in self._order()]
+
+    def clear(self):
+        self._meta = [None] * self.capacity
+        self._next = 0
+        self._size = 0
+
+
+class EmbeddingMemo:
+    """
+    LRU-кэш эмбеддингов по хэшу предобработанного текста.
+
+    Позволяет проверке на дубликат и последующему добавлению
+    использовать один и тот же результат encode.
+    """
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: OrderedDict[str, np.ndarray] = OrderedDict()
+
+    @staticmethod
+    def key(clean_text: str) -> str:
+        return hashlib.sha1(clean_text.encode('utf-8')).hexdigest()
+
+    def get(self, clean_text: str):
+        key = self.key(clean_text)
+        vector = self._items.get(key)
+        if vector is not None:
+            self._items.move_to_end(key)
+        return vector
+
+    def put(self, clean_text: str, vector: np.ndarray):
+        key = self.key(clean_text)
+        self._items[key] = vector
+        self._items.move_to_end(key)
+        while len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
@@ -0,0 +1,125 @@
+import os
+import json
+
+from telethon import utils
+from telethon.tl.types import InputPeerChannel, InputPeerChat, InputPeerUser
+
+
+class EntityCache:
+    """
+    Постоянный кэш сущностей Telegram: username / peer id → InputPeer.
+
+    Для каждого канала (чата, пользователя) хранится id, access_hash, тип
+    и username, поэтому повторные разрешения не ходят в сеть (get_entity /
+    ResolveUsername — частая причина FloodWait). Кэш свой у каждого бота:
+    access_hash действителен только для аккаунта, который его получил.
+
+    Запись удаляется через invalidate() (например, при ChannelPrivateError)
+    и обновляется, когда remember() видит у того же id другой username.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.records: dict[str, dict] = {}   # str(peer_id) -> запись
+        self.usernames: dict[str, str] = {}  # username (lower) -> str(peer_id)
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                records = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[ENTITY CACHE] Не удалось прочитать {self.path}: {e}")
+            return
+        for record in records:
+            self._index(record)
+        print(f"[ENTITY CACHE] Загружено сущностей: {len(self.records)}")
+
+    def _save(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(list(self.records.values()), f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def _index(self, record: dict):
+        key = str(record['peer_id'])
+        old = self.records.get(key)
+        if old and old.get('username'):
+            self.usernames.pop(old['username'].lower(), None)
+        self.records[key] = record
+        if record.get('username'):
+            self.usernames[record['username'].lower()] = key
+
+    @staticmethod
+    def _normalize(key) -> str:
+        # '@Channel' / 'Channel' / peer id / Peer* / сущность → ключ поиска
+        if isinstance(key, str) and not key.lstrip('-').isdigit():
+            return key.lstrip('@').lower()
+        if isinstance(key, str):
+            return key
+        return str(utils.get_peer_id(key))
+
+    def _find(self, key) -> dict | None:
+        norm = self._normalize(key)
+        peer_key = self.usernames.get(norm, norm)
+        return self.records.get(peer_key)
+
+    def remember(self, entity) -> dict:
+        """Сохраняет (или обновляет) запись по полной сущности Telethon."""
+        if hasattr(entity, 'broadcast') or hasattr(entity, 'megagroup'):
+            kind = 'channel'
+        elif hasattr(entity, 'bot') or hasattr(entity, 'first_name'):
+            kind = 'user'
+        else:
+            kind = 'chat'
+        record = {
+            'peer_id': utils.get_peer_id(entity),
+            'id': entity.id,
+            'access_hash': getattr(entity, 'access_hash', None),
+            'kind': kind,
+            'username': getattr(entity, 'username', None),
+        }
+        old = self.records.get(str(record['peer_id']))
+        if old and record['access_hash'] is None:
+            # «min»-сущности из апдейтов приходят без access_hash — не теряем сохранённый
+            record['access_hash'] = old.get('access_hash')
+        if old != record:
+            if old and old.get('username') != record['username']:
+                print(f"[ENTITY CACHE] {old.get('username')} → {record['username']} (id {record['id']})")
+            self._index(record)
+            self._save()
+        return record
+
+    def invalidate(self, key):
+        """Удаляет запись (канал стал приватным, сменил username и т.п.)."""
+        record = self._find(key)
+        if record is None:
+            return
+        self.records.pop(str(record['peer_id']), None)
+        if record.get('username'):
+            self.usernames.pop(record['username'].lower(), None)
+        self._save()
+        print(f"[ENTITY CACHE] Запись {key} удалена")
+
+    async def get_info(self, client, key) -> dict:
+        """Запись о сущности (id, username, ...); при промахе — один запрос get_entity."""
+        record = self._find(key)
+        if record is None:
+            if isinstance(key, str) and key.lstrip('-').isdigit():
+                key = int(key)
+            record = self.remember(await client.get_entity(key))
+        return record
+
+    async def get_input(self, client, key):
+        """InputPeer для запросов Telethon без обращения к сети при попадании в кэш."""
+        record = await self.get_info(client, key)
+        if record['kind'] == 'channel':
+            return InputPeerChannel(record['id'], record['access_hash'])
+        if record['kind'] == 'user':
+            return InputPeerUser(record['id'], record['access_hash'])
+        return InputPeerChat(record['id'])
@@ -0,0 +1,152 @@
+import os
+import json
+import numpy as np
+
+
+class HistoryLog:
+    """
+    Журнал истории дедупликатора на диске: снимок + append-only лог.
+
+    Файлы (base — путь news_file без расширения, g — номер поколения):
+      base.manifest.json   — {"generation": g, "dim": ...}, точка фиксации
+      base.g.npy           — снимок векторов float32 (читается через mmap)
+      base.g.jsonl         — метаданные снимка, по строке на вектор
+      base.g.log.f32       — векторы, дописанные после снимка (сырые float32)
+      base.g.log.jsonl     — метаданные дописанных векторов
+
+    Компакция пишет снимок нового поколения во временные файлы, переименовывает
+    их и только потом атомарно подменяет манифест, так что после падения
+    на любом шаге остаётся целым либо старое, либо новое поколение.
+    """
+
+    def __init__(self, news_file: str):
+        self.base = os.path.splitext(news_file)[0]
+        self.manifest_file = self.base + '.manifest.json'
+        self.generation = 0
+        self.dim = None
+        self.pending = 0  # записей в логе текущего поколения
+
+    def _path(self, suffix: str, generation: int = None) -> str:
+        gen = self.generation if generation is None else generation
+        return f"{self.base}.{gen}.{suffix}"
+
+    def exists(self) -> bool:
+        return os.path.exists(self.manifest_file)
+
+    @staticmethod
+    def _read_jsonl(path: str) -> tuple[list, list[int]]:
+        # Возвращает записи и смещения конца каждой целой строки
+        records, offsets = [], []
+        if not os.path.exists(path):
+            return records, offsets
+        with open(path, 'rb') as f:
+            offset = 0
+            for line in f:
+                offset += len(line)
+                if not line.endswith(b'\n'):
+                    break  # недописанная строка после падения
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    break
+                offsets.append(offset)
+        return records, offsets
+
+    def load(self) -> tuple[np.ndarray, list]:
+        """
+        Читает снимок и лог текущего поколения.
+        Хвост лога без пары «вектор + метаданные» отрезается.
+        """
+        with open(self.manifest_file, 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+        self.generation = manifest['generation']
+        self.dim = manifest['dim']
+
+        snap_path = self._path('npy')
+        if os.path.exists(snap_path) and os.path.getsize(snap_path):
+            snap_vectors = np.load(snap_path, mmap_mode='r')
+        else:
+            snap_vectors = np.zeros((0, self.dim), dtype=np.float32)
+        snap_meta, _ = self._read_jsonl(self._path('jsonl'))
+
+        log_vec_path = self._path('log.f32')
+        meta_path = self._path('log.jsonl')
+        log_meta, offsets = self._read_jsonl(meta_path)
+        row_bytes = self.dim * 4
+        rows = os.path.getsize(log_vec_path) // row_bytes if os.path.exists(log_vec_path) else 0
+        count = min(rows, len(log_meta))
+
+        # Выравниваем лог, чтобы следующие записи не съехали относительно метаданных
+        if os.path.exists(log_vec_path) and os.path.getsize(log_vec_path) != count * row_bytes:
+            with open(log_vec_path, 'r+b') as f:
+                f.truncate(count * row_bytes)
+        meta_size = offsets[count - 1] if count else 0
+        if os.path.exists(meta_path) and os.path.getsize(meta_path) != meta_size:
+            with open(meta_path, 'r+b') as f:
+                f.truncate(meta_size)
+
+        if count:
+            log_vectors = np.memmap(log_vec_path, dtype=np.float32, mode='r', shape=(count, self.dim))
+        else:
+            log_vectors = np.zeros((0, self.dim), dtype=np.float32)
+
+        self.pending = count
+        vectors = np.concatenate([np.asarray(snap_vectors), np.asarray(log_vectors)])
+        return vectors, snap_meta[:len(snap_vectors)] + log_meta[:count]
+
+    def append(self, vectors, metas: list):
+        """Дописывает записи в лог текущего поколения (без перезаписи истории)."""
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(metas), -1)
+        if self.dim is None:
+            self.compact(np.zeros((0, vectors.shape[1]), dtype=np.float32), [])
+
+        with open(self._path('log.f32'), 'ab') as f:
+            f.write(vectors.tobytes())
+        with open(self._path('log.jsonl'), 'a', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(m, ensure_ascii=False) + '\n' for m in metas))
+        self.pending += len(metas)
+
+    def compact(self, vectors, metas: list):
+        """Переписывает всю историю в снимок нового поколения и обнуляет лог."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        dim = vectors.shape[1] if vectors.ndim == 2 else self.dim
+        old_generation = self.generation if self.exists() else None
+        new_generation = self.generation + 1
+
+        directory = os.path.dirname(self.base)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        snap_path = self._path('npy', new_generation)
+        with open(snap_path + '.tmp', 'wb') as f:
+            np.save(f, vectors)
+            f.flush()
+            os.fsync(f.fileno())
+        meta_path = self._path('jsonl', new_generation)
+        with open(meta_path + '.tmp', 'w', encoding='utf-8') as f:
+            f.write(''.join(json.dumps(m, ensure_ascii=False) + '\n' for m in metas))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(snap_path + '.tmp', snap_path)
+        os.replace(meta_path + '.tmp', meta_path)
+        for suffix in ('log.f32', 'log.jsonl'):
+            # Остатки лога от прерванной компакции не должны попасть в новое поколение
+            path = self._path(suffix, new_generation)
+            if os.path.exists(path):
+                os.remove(path)
+
+        with open(self.manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'generation': new_generation, 'dim': dim}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(self.manifest_file + '.tmp', self.manifest_file)
+
+        self.generation = new_generation
+        self.dim = dim
+        self.pending = 0
+
+        if old_generation is not None:
+            for suffix in ('npy', 'jsonl', 'log.f32', 'log.jsonl'):
+                path = self._path(suffix, old_generation)
+                if os.path.exists(path):
+                    os.remove(path)
@@ -9,36 +9,8 @@ PROMPTS_PATH = Path("config/prompts.json")
 with open(PROMPTS_PATH, "r", encoding="utf-8-sig") as f:
     PROMPTS = json.load(f)
 
-# Загрузка конфигурации LLM и бэкенда
-with open("config/llm_config.json", "r", encoding="utf-8") as f:
-    llm_conf = json.load(f)
-
-llm_backend = llm_conf.get("llm_backend", 0)
-
-if llm_backend == 0:
-    print("Используется OpenAI")
-    from openai import OpenAI
-    client = OpenAI(
-        base_url=llm_conf["base_url_Open_AI"],
-        api_key=llm_conf["api_key_Open_AI"],
-    )
-elif llm_backend == 1:
-    print("Используется LangChain+Groq")
-    from langchain_groq import ChatGroq
-    from langchain_core.messages import HumanMessage
-    client = ChatGroq(
-        model=llm_conf.get("model_LANGCHAIN", "llama3-8b-8192"),
-        api_key=llm_conf["api_key_LANGCHAIN"]
-    )
-else:
-    print("Используется LangChain+Mistral")
-    from langchain_mistralai import ChatMistralAI
-    from langchain_core.messages import HumanMessage
-
-    client = ChatMistralAI(
-        model_name=llm_conf.get("model_LANGCHAIN_mistral", "mistral-medium-latest"),
-        api_key=llm_conf["api_key_LANGCHAIN_mistral"]
-    )
+# Общий LLM-шлюз (клиент и повторы при 429 настраиваются в одном месте)
+from src.llm_gateway import complete
 
 DEPARTMENTS = [
     "Кибербезопасность",
@@ -48,11 +20,6 @@ DEPARTMENTS = [
     "Комплаенс"
 ]
 
-import asyncio
-
-# Глобальный семафор для ограничения RPS (1 запрос в 1.2 секунды для Mistral Free)
-llm_semaphore = asyncio.Semaphore(1)
-
 def clean_department_response(resp: str) -> list[str]:
     resp = resp.strip()
     parts = [item.strip(" '\"*").lower() for item in resp.split(",") if item.strip()]
@@ -70,92 +37,96 @@ def clean_rating_response(resp: str) -> int:
     except ValueError:
         return 0
 
+def clean_analysis_response(resp: str) -> list[dict] | None:
+    """
+    Разбирает JSON-ответ промпта analysis в список
+    [{"department", "summary", "engagement"}, ...] с департаментами строго из DEPARTMENTS.
+    Пустой список — «Без категории»; None — ответ не соответствует схеме.
+    """
+    match = re.search(r"\{.*\}", resp, re.DOTALL)
+    if not match:
+        return None
+    try:
+        data = json.loads(match.group(0))
+    except ValueError:
+        return None
+    items = data.get("departments") if isinstance(data, dict) else None
+    if not isinstance(items, list):
+        return None
+
+    departments_lower = {d.lower(): d for d in DEPARTMENTS}
+    result = []
+    for item in items:
+        if not isinstance(item, dict):
+            continue
+        dept = departments_lower.get(str(item.get("department", "")).strip(" '\"*").lower())
+        if dept is None or any(r["department"] == dept for r in result):
+            continue
+        result.append({
+            "department": dept,
+            "summary": str(item.get("summary") or "").strip(),
+            "engagement": clean_rating_response(str(item.get("engagement", ""))),
+        })
+    if items and not result:
+        return None  # модель вернула департаменты не из списка
+    return result
+
+async def analyze_news(news_text: str) -> list[dict] | None:
+    """
+    Классификация, резюме и оценка интересности по всем департаментам
+    одним запросом. None — если запрос или разбор ответа не удался
+    (тогда вызывающий код возвращается к отдельным запросам).
+    """
+    prompt = PROMPTS["analysis"].format(
+        departments=", ".join(DEPARTMENTS),
+        text=news_text
+    )
+
+    try:
+        raw = await complete(prompt, template_id="analysis")
+        print(f"Сырой ответ модели: {raw}")
+    except Exception as e:
+        print(f"[ERROR ANALYZE] {e}")
+        return None
+
+    result = clean_analysis_response(raw)
+    if result is None:
+        print("[ERROR ANALYZE] Ответ не соответствует схеме JSON")
+    else:
+        print(f"[DEBUG] Анализ: {[(r['department'], r['engagement']) for r in result]}")
+    return result
+
 async def classify_department(news_text: str) -> list[str]:
     prompt = PROMPTS["classification"].format(
         departments=", ".join(DEPARTMENTS),
         text=news_text
     )
-    
-    max_retries = 5
-    current_delay = 2.0
-    
-    async with llm_semaphore:
-        for attempt in range(max_retries + 1):
-            try:
-                if llm_backend == 0:
-                    resp = client.chat.completions.create(
-                        model=llm_conf["model_Open_AI"],
-                        extra_body={},
-                        messages=[{"role": "user", "content": prompt}]
-                    )
-                    raw = resp.choices[0].message.content
-                else:
-                    # Используем ainvoke для LangChain
-                    res = await client.ainvoke([HumanMessage(content=prompt)])
-                    raw = res.content
-
-                print(f"Сырой ответ модели: {raw}")
-                # Обязательная пауза ПОСЛЕ успешного запроса, чтобы не частить (1.2с для запаса)
-                await asyncio.sleep(1.2)
-                
-                depts = clean_department_response(raw)
-                print(f"[DEBUG] Классифицировано в департаменты: {depts}")
-                return depts
-                
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "rate" in error_str.lower():
-                    if attempt < max_retries:
-                        print(f"[CLASSIFY] Rate limit (429). Retrying in {current_delay}s... (Attempt {attempt + 1}/{max_retries})")
-                        await asyncio.sleep(current_delay)
-                        current_delay *= 2
-                        continue
-                print(f"[ERROR CLASSIFY] {e}")
-                return ["Без категории"]
-    
-    return ["Без категории"]
+
+    # Темп запросов держит лимитер LLM-шлюза (llm_rpm / llm_tpm / llm_concurrency)
+    try:
+        raw = await complete(prompt, template_id="classification")
+        print(f"Сырой ответ модели: {raw}")
+        depts = clean_department_response(raw)
+        print(f"[DEBUG] Классифицировано в департаменты: {depts}")
+        return depts
+    except Exception as e:
+        print(f"[ERROR CLASSIFY] {e}")
+        return ["Без категории"]
 
 async def rate_engagement(text: str, department: str) -> int:
     prompt = PROMPTS["rating"].format(
         department=department or "общей аудитории",
         text=text
     )
-    
-    max_retries = 5
-    current_delay = 2.0
-    
-    async with llm_semaphore:
-        for attempt in range(max_retries + 1):
-            try:
-                if llm_backend == 0:
-                    resp = client.chat.completions.create(
-                        model=llm_conf["model_Open_AI"],
-                        extra_body={},
-                        messages=[{"role": "user", "content": prompt}],
-                    )
-                    raw = resp.choices[0].message.content
-                else:
-                    res = await client.ainvoke([HumanMessage(content=prompt)])
-                    raw = res.content
-
-                await asyncio.sleep(1.2)
-                rating = clean_rating_response(raw)
-                print(f"[DEBUG] Интересность новости: {rating}")
-                return rating
-                
-            except Exception as e:
-                error_str = str(e)
-                if "429" in error_str or "rate" in error_str.lower():
-                    if attempt < max_retries:
-                        print(f"[RATING] Rate limit (429). Retrying in {current_delay}s... (Attempt {attempt + 1}/{max_retries})")
-                        await asyncio.sleep(current_delay)
-                        current_delay *= 2
-                        continue
-                print(f"[LLM RATING ERROR] {e}")
-                return 0
-    
-    return 0
 
+    try:
+        raw = await complete(prompt, template_id="rating")
+        rating = clean_rating_response(raw)
+        print(f"[DEBUG] Интересность новости: {rating}")
+        return rating
+    except Exception as e:
+        print(f"[LLM RATING ERROR] {e}")
+        return 0
 
 if __name__ == "__main__":
     # Тестовые новости
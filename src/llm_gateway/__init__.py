@@ -0,0 +1,4 @@
+from src.llm_gateway.cache import LLMCache
+from src.llm_gateway.gateway import LLMGateway, complete, get_gateway, is_rate_limit_error
+
+__all__ = ["LLMCache", "LLMGateway", "complete", "get_gateway", "is_rate_limit_error"]
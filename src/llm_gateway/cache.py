@@ -0,0 +1,97 @@
+import os
+import re
+import time
+import sqlite3
+import hashlib
+
+
+def normalize_text(text: str) -> str:
+    # Пробелы и переносы не влияют на ответ модели, но ломают совпадение ключа
+    return re.sub(r"\s+", " ", text or "").strip()
+
+
+class LLMCache:
+    """
+    Дисковый кэш ответов LLM (SQLite).
+
+    Ключ — хэш от (бэкенд, модель, id шаблона промпта, нормализованный
+    текст запроса), поэтому одна и та же новость, пришедшая из нескольких
+    каналов или повторно через refill, не оплачивается второй раз.
+    Записи старше ttl_hours считаются промахом; при превышении max_entries
+    вытесняются давно не читавшиеся (LRU по last_access).
+    """
+
+    def __init__(self, path: str, ttl_hours: float | None = 24, max_entries: int = 10000):
+        self.path = path
+        self.ttl = ttl_hours * 3600 if ttl_hours else None
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key         TEXT PRIMARY KEY,
+                template_id TEXT,
+                response    TEXT NOT NULL,
+                created     REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses(last_access)")
+        if self.ttl:
+            self._db.execute("DELETE FROM responses WHERE created < ?", (time.time() - self.ttl,))
+        self._db.commit()
+
+    @staticmethod
+    def make_key(backend, model: str, template_id: str | None, prompt: str,
+                 system: str | None = None, max_tokens: int | None = None) -> str:
+        parts = [str(backend), model, template_id or "", normalize_text(system), normalize_text(prompt), str(max_tokens or "")]
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> str | None:
+        now = time.time()
+        row = self._db.execute("SELECT response, created FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is not None and self.ttl and now - row[1] > self.ttl:
+            self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+            self._db.commit()
+            row = None
+        if row is None:
+            self.misses += 1
+            return None
+
+        self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+        self._db.commit()
+        self.hits += 1
+        return row[0]
+
+    def put(self, key: str, response: str, template_id: str | None = None):
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO responses (key, template_id, response, created, last_access) VALUES (?, ?, ?, ?, ?)",
+            (key, template_id, response, now, now),
+        )
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY last_access LIMIT ?)",
+                (count - self.max_entries,),
+            )
+        self._db.commit()
+
+    def stats(self) -> dict:
+        (count,) = self._db.execute("SELECT COUNT(*) FROM responses").fetchone()
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": count,
+        }
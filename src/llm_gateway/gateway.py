@@ -0,0 +1,182 @@
+import json
+
+from src.llm_gateway.cache import LLMCache
+from src.llm_gateway.rate_limiter import TokenBucketLimiter, retry_after_seconds
+
+DEFAULT_CONFIG = "config/llm_config.json"
+
+BACKEND_NAMES = {0: "OpenAI", 1: "LangChain+Groq", 2: "LangChain+Mistral"}
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    # Только настоящий 429: по коду ответа SDK, иначе по тексту ошибки
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    if status is not None:
+        return status == 429
+    error_str = str(error)
+    return "429" in error_str or "Too Many Requests" in error_str
+
+
+class LLMGateway:
+    """
+    Единая точка доступа к LLM для всех ботов.
+
+    Один клиент на конфиг (OpenAI / Groq / Mistral), создаётся лениво при
+    первом запросе и переиспользует HTTP-соединения. Здесь же — общая
+    политика повторов при 429, ограничитель скорости (RPM/TPM и число
+    одновременных запросов) и дисковый кэш ответов.
+    """
+
+    def __init__(self, config_path: str = DEFAULT_CONFIG):
+        with open(config_path, "r", encoding="utf-8-sig") as f:
+            self.conf = json.load(f)
+        self.backend = self.conf.get("llm_backend", 0)
+        self.max_retries = self.conf.get("llm_max_retries", 5)
+        self.initial_delay = self.conf.get("llm_retry_delay_seconds", 2.0)
+        self.limiter = TokenBucketLimiter(
+            rpm=self.conf.get("llm_rpm", 50),
+            tpm=self.conf.get("llm_tpm"),
+            concurrency=self.conf.get("llm_concurrency", 4),
+        )
+        cache_file = self.conf.get("llm_cache_file", "cache/llm_cache.sqlite3")
+        self.cache = LLMCache(
+            cache_file,
+            ttl_hours=self.conf.get("llm_cache_ttl_hours", 24),
+            max_entries=self.conf.get("llm_cache_max_entries", 10000),
+        ) if cache_file else None
+        self._client = None
+
+    @property
+    def model(self) -> str:
+        if self.backend == 0:
+            return self.conf["model_Open_AI"]
+        if self.backend == 1:
+            return self.conf.get("model_LANGCHAIN", "llama3-8b-8192")
+        return self.conf.get("model_LANGCHAIN_mistral", "mistral-medium-latest")
+
+    @property
+    def client(self):
+        if self._client is None:
+            self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        print(f"[LLM GATEWAY] Используется {BACKEND_NAMES.get(self.backend, self.backend)}")
+        max_connections = self.conf.get("llm_max_connections", 10)
+        timeout = self.conf.get("llm_timeout_seconds", 60)
+
+        if self.backend == 0:
+            import httpx
+            from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+
+            return AsyncOpenAI(
+                base_url=self.conf["base_url_Open_AI"],
+                api_key=self.conf["api_key_Open_AI"],
+                timeout=timeout,
+                http_client=DefaultAsyncHttpxClient(
+                    limits=httpx.Limits(
+                        max_connections=max_connections,
+                        max_keepalive_connections=max_connections,
+                    )
+                ),
+            )
+        if self.backend == 1:
+            from langchain_groq import ChatGroq
+
+            return ChatGroq(
+                model=self.model,
+                api_key=self.conf["api_key_LANGCHAIN"],
+                timeout=timeout,
+            )
+
+        from langchain_mistralai import ChatMistralAI
+
+        return ChatMistralAI(
+            model_name=self.model,
+            api_key=self.conf["api_key_LANGCHAIN_mistral"],
+            timeout=timeout,
+            max_concurrent_requests=max_connections,
+        )
+
+    async def _request(self, prompt: str, system: str | None, max_tokens: int | None) -> str:
+        if self.backend == 0:
+            messages = [{"role": "user", "content": prompt}]
+            if system:
+                messages.insert(0, {"role": "system", "content": system})
+            kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+            resp = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                **kwargs,
+            )
+            return (resp.choices[0].message.content or "").strip()
+
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        messages = [HumanMessage(content=prompt)]
+        if system:
+            messages.insert(0, SystemMessage(content=system))
+        kwargs = {"max_tokens": max_tokens} if max_tokens else {}
+        res = await self.client.ainvoke(messages, **kwargs)
+        return res.content.strip()
+
+    @staticmethod
+    def estimate_tokens(prompt: str, system: str | None, max_tokens: int | None) -> int:
+        # Грубая оценка для TPM: ~3 символа на токен плюс запас на ответ
+        return (len(prompt) + len(system or "")) // 3 + (max_tokens or 256)
+
+    async def complete(self, prompt: str, system: str | None = None, max_tokens: int | None = None,
+                       template_id: str | None = None) -> str:
+        """
+        Возвращает текст ответа модели.
+        Сначала ищет ответ в кэше (template_id — имя шаблона промпта, входит в ключ).
+        При 429 замедляет лимитер (пауза по Retry-After или экспоненциальная)
+        и повторяет запрос, остальные ошибки пробрасывает.
+        """
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.make_key(self.backend, self.model, template_id, prompt, system, max_tokens)
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                stats = self.cache.stats()
+                print(f"[LLM CACHE] Попадание ({template_id}): {stats['hits']} попаданий / {stats['misses']} промахов")
+                return cached
+
+        tokens = self.estimate_tokens(prompt, system, max_tokens)
+        for attempt in range(self.max_retries + 1):
+            async with self.limiter.slot(tokens):
+                try:
+                    result = await self._request(prompt, system, max_tokens)
+                except Exception as e:
+                    if not is_rate_limit_error(e) or attempt >= self.max_retries:
+                        raise
+                    delay = self.limiter.on_rate_limited(
+                        retry_after_seconds(e),
+                        fallback=self.initial_delay * 2 ** attempt,
+                    )
+                    print(f"[LLM GATEWAY] Rate limit (429). Retrying in {delay:.1f}s... (Attempt {attempt + 1}/{self.max_retries})")
+                    continue
+            self.limiter.on_success()
+            if cache_key is not None:
+                self.cache.put(cache_key, result, template_id)
+            return result
+
+
+_gateways: dict[str, LLMGateway] = {}
+
+
+def get_gateway(config_path: str = DEFAULT_CONFIG) -> LLMGateway:
+    """Один шлюз (и один клиент) на файл конфигурации."""
+    gateway = _gateways.get(config_path)
+    if gateway is None:
+        gateway = LLMGateway(config_path)
+        _gateways[config_path] = gateway
+    return gateway
+
+
+async def complete(prompt: str, system: str | None = None, max_tokens: int | None = None,
+                   template_id: str | None = None) -> str:
+    """complete() через шлюз основного бота (config/llm_config.json)."""
+    return await get_gateway().complete(prompt, system=system, max_tokens=max_tokens, template_id=template_id)
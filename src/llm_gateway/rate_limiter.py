@@ -0,0 +1,107 @@
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+
+class TokenBucketLimiter:
+    """
+    Ограничитель запросов к LLM: token bucket по запросам в минуту (RPM)
+    и, опционально, по токенам в минуту (TPM), плюс лимит одновременных
+    запросов.
+
+    При 429 скорость адаптивно снижается вдвое и все запросы ждут паузу
+    из Retry-After; после успешных ответов скорость плавно возвращается
+    к настроенной.
+    """
+
+    def __init__(self, rpm: float, tpm: float | None = None, concurrency: int = 4):
+        self.max_rate = rpm / 60.0          # запросов в секунду по конфигу
+        self.rate = self.max_rate           # текущая (адаптивная) скорость
+        self.tpm = tpm
+        self.capacity = max(1, concurrency)
+        self._requests = float(self.capacity)
+        self._tokens = float(tpm) if tpm else 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+        self._slots = asyncio.Semaphore(self.capacity)
+
+    def _refill(self, now: float):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.capacity, self._requests + elapsed * self.rate)
+        if self.tpm:
+            token_rate = self.tpm / 60.0 * (self.rate / self.max_rate)
+            self._tokens = min(self.tpm, self._tokens + elapsed * token_rate)
+
+    async def acquire(self, tokens: int = 0):
+        # Токенов на запрос не может понадобиться больше, чем помещается в ведро
+        tokens = min(tokens, self.tpm) if self.tpm else 0
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                wait = 0.0
+                if self._requests < 1:
+                    wait = (1 - self._requests) / self.rate
+                if self.tpm and self._tokens < tokens:
+                    token_rate = self.tpm / 60.0 * (self.rate / self.max_rate)
+                    wait = max(wait, (tokens - self._tokens) / token_rate)
+                if wait <= 0:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                await asyncio.sleep(wait)
+
+    @asynccontextmanager
+    async def slot(self, tokens: int = 0):
+        """Слот на один запрос: лимит параллельности + токены из ведра."""
+        async with self._slots:
+            await self.acquire(tokens)
+            yield
+
+    def on_success(self):
+        # Аддитивное восстановление скорости после снижения
+        self.rate = min(self.max_rate, self.rate + self.max_rate * 0.05)
+
+    def on_rate_limited(self, retry_after: float | None, fallback: float) -> float:
+        """
+        Реакция на 429: снижает скорость и ставит общую паузу.
+        Возвращает длительность паузы в секундах.
+        """
+        self.rate = max(self.max_rate * 0.1, self.rate / 2)
+        delay = retry_after if retry_after is not None else fallback
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        return delay
+
+
+def retry_after_seconds(error: Exception) -> float | None:
+    """Достаёт Retry-After (секунды или HTTP-дата) из ответа, приложенного к исключению."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    value = headers.get("retry-after-ms")
+    if value:
+        try:
+            return float(value) / 1000
+        except ValueError:
+            pass
+
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        moment = parsedate_to_datetime(value)
+        return max(0.0, moment.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
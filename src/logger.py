@@ -1,26 +1,138 @@
+import os
+import sys
 import json
-import pandas as pd
+import atexit
+import asyncio
+import threading
 from datetime import datetime
 
 with open('config/config.json', 'r', encoding='utf-8-sig') as f:
     cfg = json.load(f)
 log_file = cfg.get('log_file', 'logs/bot_logs.xlsx')
+journal_file = cfg.get('log_journal', 'logs/bot_logs.jsonl')
 
+COLUMNS = ['Время', 'Тип', 'Канал', 'Сообщение']
 
-def log_action(action_type: str, message: str, source_channel: str):
+
+class LogSink:
+    """
+    Буферизованный журнал событий.
+
+    log_action только кладёт строку в буфер; на диск (JSONL, одна строка
+    на событие, дозапись в конец файла) буфер сбрасывается пачкой —
+    при накоплении flush_rows строк или раз в flush_seconds секунд,
+    в отдельном потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, path: str, flush_rows: int = 50, flush_seconds: float = 30):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_seconds = flush_seconds
+        self._buffer: list[dict] = []
+        self._buffer_lock = threading.Lock()
+        self._file_lock = threading.Lock()
+        self._loop = None
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        asyncio.create_task(self._periodic_flush())
+
+    async def _periodic_flush(self):
+        while True:
+            await asyncio.sleep(self.flush_seconds)
+            await asyncio.to_thread(self.flush)
+
+    def write(self, row: dict):
+        with self._buffer_lock:
+            self._buffer.append(row)
+            full = len(self._buffer) >= self.flush_rows
+        if not full:
+            return
+        if self._loop is not None and self._loop.is_running():
+            self._loop.create_task(asyncio.to_thread(self.flush))
+        else:
+            self.flush()
+
+    def flush(self):
+        with self._buffer_lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return
+        try:
+            with self._file_lock:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in rows))
+        except Exception as e:
+            print(f"[LOGGER] Ошибка записи журнала: {e}")
+
+    def read_rows(self) -> list[dict]:
+        self.flush()
+        if not os.path.exists(self.path):
+            return []
+        rows = []
+        with self._file_lock, open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rows.append(json.loads(line))
+                except ValueError:
+                    continue  # недописанная строка
+        return rows
+
+
+sink = LogSink(
+    journal_file,
+    flush_rows=cfg.get('log_flush_rows', 50),
+    flush_seconds=cfg.get('log_flush_seconds', 30),
+)
+atexit.register(sink.flush)
+
+
+def _import_legacy_xlsx():
+    # Разовый перенос истории из старого Excel-лога в журнал
+    if os.path.exists(journal_file) or not os.path.exists(log_file):
+        return
     try:
+        import pandas as pd
         df = pd.read_excel(log_file)
-    except FileNotFoundError:
-        df = pd.DataFrame(columns=['Время', 'Тип', 'Канал', 'Сообщение'])
-    new_row = {
+        for row in df.reindex(columns=COLUMNS).fillna('').astype(str).to_dict('records'):
+            sink.write(row)
+        sink.flush()
+        print(f"[LOGGER] Перенесено {len(df)} строк из {log_file}")
+    except Exception as e:
+        print(f"[LOGGER] Не удалось перенести {log_file}: {e}")
+
+
+_import_legacy_xlsx()
+
+
+def log_action(action_type: str, message: str, source_channel: str):
+    sink.write({
         'Время': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
         'Тип': action_type,
         'Канал': source_channel,
         'Сообщение': message
-    }
-    df = pd.concat([df, pd.DataFrame([new_row])], ignore_index=True)
-    df.to_excel(log_file, index=False)
+    })
 
 
 def log_error(error: str):
-    log_action('ERROR', error, 'SYSTEM')
\ No newline at end of file
+    log_action('ERROR', error, 'SYSTEM')
+
+
+def export_xlsx(path: str = None) -> str:
+    """Выгружает журнал в Excel с прежними колонками (Время, Тип, Канал, Сообщение)."""
+    import pandas as pd
+
+    path = path or log_file
+    df = pd.DataFrame(sink.read_rows(), columns=COLUMNS)
+    df.to_excel(path, index=False)
+    print(f"[LOGGER] Выгружено {len(df)} строк в {path}")
+    return path
+
+
+if __name__ == "__main__":
+    # python -m src.logger export [путь.xlsx]
+    if len(sys.argv) >= 2 and sys.argv[1] == 'export':
+        export_xlsx(sys.argv[2] if len(sys.argv) > 2 else None)
+    else:
+        print("Использование: python -m src.logger export [путь.xlsx]")
@@ -0,0 +1,140 @@
+import time
+import heapq
+import asyncio
+from collections import Counter
+
+from src.logger import log_error
+
+# Приоритеты (меньше — важнее)
+PRIORITY_LIVE = 0     # новые сообщения из каналов
+PRIORITY_REFILL = 1   # дозапрос пропущенных и парсеры
+
+
+class Pipeline:
+    """
+    Очередь между приёмом сообщений Telegram и обработкой через LLM.
+
+    Хендлер Telethon только кладёт сообщение в ограниченную очередь
+    (submit; фоновые источники — put, который ждёт места), а N воркеров
+    по очереди прогоняют его через handler (дедупликация →
+    классификация → резюме → оценка); у элемента может быть свой
+    handler (например, записи парсеров — handle_entry). Если очередь
+    заполнена, отбрасывается самое старое сообщение с наименьшим
+    приоритетом (или новое, если оно менее важно всех в очереди) —
+    о каждом отброшенном элементе сообщается в on_drop(handler, args).
+    Раз в report_seconds печатается глубина очереди, время ожидания
+    и число отброшенных сообщений.
+    """
+
+    def __init__(self, handler, workers: int = 4, maxsize: int = 200, report_seconds: float = 60,
+                 on_drop=None):
+        self.handler = handler
+        self.on_drop = on_drop
+        self.workers = max(1, workers)
+        self.maxsize = max(1, maxsize)
+        self.report_seconds = report_seconds
+        self._heap: list = []   # (priority, seq, enqueued_at, handler, args)
+        self._seq = 0
+        self._not_empty = asyncio.Event()
+        self._not_full = asyncio.Event()
+        self._tasks: list[asyncio.Task] = []
+
+        self.processed = 0
+        self.failed = 0
+        self.dropped = Counter()   # priority -> отброшено
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._wait_count = 0
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def submit(self, *args, priority: int = PRIORITY_LIVE, handler=None) -> bool:
+        """Ставит сообщение в очередь без ожидания. False — сообщение отброшено."""
+        handler = handler or self.handler
+        if len(self._heap) >= self.maxsize:
+            # Кандидат на вытеснение: наименее важный, среди равных — самый старый
+            victim = max(range(len(self._heap)), key=lambda i: (self._heap[i][0], -self._heap[i][1]))
+            victim_priority = self._heap[victim][0]
+            if victim_priority < priority:
+                self.dropped[priority] += 1
+                self._notify_drop(handler, args)
+                return False
+            _, _, _, victim_handler, victim_args = self._heap[victim]
+            self._heap[victim] = self._heap[-1]
+            self._heap.pop()
+            heapq.heapify(self._heap)
+            self.dropped[victim_priority] += 1
+            self._notify_drop(victim_handler, victim_args)
+
+        self._seq += 1
+        heapq.heappush(self._heap, (priority, self._seq, time.monotonic(), handler, args))
+        self._not_empty.set()
+        return True
+
+    def _notify_drop(self, handler, args):
+        if self.on_drop is None:
+            return
+        try:
+            self.on_drop(handler, args)
+        except Exception as e:
+            log_error(f"Pipeline on_drop: {e}")
+
+    async def put(self, *args, priority: int = PRIORITY_REFILL, handler=None):
+        """Как submit, но при заполненной очереди ждёт места (для фоновых источников вроде refill)."""
+        while len(self._heap) >= self.maxsize:
+            self._not_full.clear()
+            await self._not_full.wait()
+        self.submit(*args, priority=priority, handler=handler)
+
+    async def start(self):
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        if self.report_seconds:
+            self._tasks.append(asyncio.create_task(self._report()))
+        print(f"[PIPELINE] Воркеров: {self.workers}, размер очереди: {self.maxsize}")
+
+    async def _worker(self):
+        while True:
+            while not self._heap:
+                self._not_empty.clear()
+                await self._not_empty.wait()
+            _, _, enqueued_at, handler, args = heapq.heappop(self._heap)
+            self._not_full.set()
+
+            wait = time.monotonic() - enqueued_at
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+            self._wait_count += 1
+            try:
+                await handler(*args)
+                self.processed += 1
+            except Exception as e:
+                self.failed += 1
+                print(f"[PIPELINE ERROR] {e}")
+                log_error(f"Pipeline: {e}")
+
+    def stats(self) -> dict:
+        """Метрики с момента прошлого вызова (ожидание) и накопительные счётчики."""
+        avg_wait = self._wait_total / self._wait_count if self._wait_count else 0.0
+        stats = {
+            "depth": len(self._heap),
+            "avg_wait": avg_wait,
+            "max_wait": self._wait_max,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": dict(self.dropped),
+        }
+        self._wait_total = self._wait_max = 0.0
+        self._wait_count = 0
+        return stats
+
+    async def _report(self):
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            s = self.stats()
+            print(
+                f"[PIPELINE] Очередь: {s['depth']}/{self.maxsize}, "
+                f"ожидание ср {s['avg_wait']:.1f} с / макс {s['max_wait']:.1f} с, "
+                f"обработано {s['processed']}, ошибок {s['failed']}, отброшено {s['dropped']}"
+            )
@@ -1,41 +1,92 @@
 # src/processor.py
 import json
+import asyncio
 
 from src.batcher import Batcher
 from src.deduplicator import Deduplicator
-from src.logger import log_action
-from src.llm_classifier import classify_department, rate_engagement
+from src.logger import log_action, log_error
+from src.llm_classifier import analyze_news, classify_department, rate_engagement
 from src.router import get_target_channel
+from src.summarizer import summarize_text
 
 with open("config/config.json", "r", encoding="utf-8-sig") as f:
     conf = json.load(f)
 
 # единый глобальный экземпляр
 deduper = Deduplicator(conf.get('dedup_threshold', 0.95))
-batcher = Batcher(interval_minutes=conf.get('batch_interval_minutes'), max_per_batch=conf.get('max_per_batch'))
+batcher = Batcher(
+    interval_minutes=conf.get('batch_interval_minutes'),
+    max_per_batch=conf.get('max_per_batch'),
+    compact_every=conf.get('pending_compact_every', 200),
+    send_interval=conf.get('send_interval_seconds', 1.0),
+)
+
+async def analyze(text: str, summarize: bool = True) -> list[dict]:
+    """
+    Департаменты, резюме и интересность новости:
+    [{"department", "summary", "engagement"}, ...], пустой список — «Без категории».
+
+    При fused_analysis всё получается одним запросом к LLM; если он не удался
+    или ответ не прошёл проверку — прежний путь: классификация, затем
+    резюме и оценка отдельно для каждого департамента (одновременно).
+    """
+    if conf.get('fused_analysis', True):
+        result = await analyze_news(text)
+        if result is not None:
+            return result
+
+    depts = await classify_department(text)
+    if "Без категории" in depts:
+        return []
+
+    # Резюме и оценки по всем департаментам идут параллельно (темп держит лимитер шлюза);
+    # таймаут или ошибка по одному департаменту не мешают остальным
+    timeout = conf.get('department_timeout_seconds', 120)
+    outcomes = await asyncio.gather(
+        *(asyncio.wait_for(_analyze_department(text, dept, summarize), timeout) for dept in depts),
+        return_exceptions=True,
+    )
+
+    result = []
+    for dept, outcome in zip(depts, outcomes):
+        if isinstance(outcome, BaseException):
+            reason = "таймаут" if isinstance(outcome, asyncio.TimeoutError) else outcome
+            print(f"[PROCESSOR ERROR] {dept}: {reason}")
+            log_error(f"Обработка департамента {dept}: {reason}")
+            continue
+        if outcome is not None:
+            result.append(outcome)
+    return result
+
+async def _analyze_department(text: str, dept: str, summarize: bool) -> dict | None:
+    if summarize:
+        summary, engagement = await asyncio.gather(
+            summarize_text(text, dept),
+            rate_engagement(text, dept),
+        )
+        # Пропускаем, если суммаризатор вернул пустой ответ
+        if not summary or "Пустой ответ" in summary:
+            return None
+    else:
+        summary, engagement = "", await rate_engagement(text, dept)
+    return {"department": dept, "summary": summary, "engagement": engagement}
 
 async def handle_entry(entry: dict):
     text = entry["text"]
     link = entry["link"]
 
     # дедупликация по тексту
-    if deduper.is_duplicate(text):
+    if deduper.check_and_add(text):
         return
-    deduper.add(text)
 
     log_action("GET", text, link)
 
-    depts = await classify_department(text)
-
-    if "Без категории" in depts:
-        return
-
-    for dept in depts:
-        score = await rate_engagement(text, dept)
+    for item in await analyze(text, summarize=False):
+        score = item["engagement"]
         payload = (
             f"{text}\n\n"
             f"🔗 Оригинал: {link}\n"
             f"👀 Интересность : {score}\n"
         )
-        target = get_target_channel(dept)
+        target = get_target_channel(item["department"])
         batcher.add(payload, target, score)
\ No newline at end of file
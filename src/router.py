@@ -1,12 +1,39 @@
+import os
 import json
 
+CONFIG_PATH = 'config/config.json'
+FALLBACK_DEPARTMENT = 'Без категории'
+
+# Таблица маршрутизации в памяти; перечитывается только при изменении mtime конфига
+_mapping: dict = {}
+_fallback = None
+_mtime = None
+
+
 def load_department_channels():
-    with open('config/config.json', 'r', encoding='utf-8-sig') as f:
+    with open(CONFIG_PATH, 'r', encoding='utf-8-sig') as f:
         cfg = json.load(f)
     return cfg.get('department_channels', {})
 
 
+def _refresh():
+    global _mapping, _fallback, _mtime
+    try:
+        mtime = os.stat(CONFIG_PATH).st_mtime_ns
+    except OSError:
+        return  # конфиг временно недоступен — работаем по старой таблице
+    if mtime == _mtime:
+        return
+    try:
+        mapping = load_department_channels()
+    except (OSError, ValueError) as e:
+        # Файл могут сохранять прямо сейчас — попробуем при следующем вызове
+        print(f"[ROUTER ERROR] Не удалось перечитать {CONFIG_PATH}: {e}")
+        return
+    _mapping, _fallback, _mtime = mapping, mapping.get(FALLBACK_DEPARTMENT), mtime
+    print(f"[ROUTER] Загружено каналов департаментов: {len(_mapping)}")
+
+
 def get_target_channel(department: str) -> str:
-    mapping = load_department_channels()
-    print(f"[DEBUG] Для департамента «{department}» выбран канал «{mapping.get(department, mapping.get('Без категории'))}»")
-    return mapping.get(department, mapping.get('Без категории'))
\ No newline at end of file
+    _refresh()
+    return _mapping.get(department, _fallback)
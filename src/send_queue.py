@@ -0,0 +1,98 @@
+import time
+import asyncio
+
+from telethon.errors import FloodWaitError
+
+TELEGRAM_MESSAGE_LIMIT = 4096  # в UTF-16 code units
+
+
+def utf16_len(text: str) -> int:
+    """Длина так, как её считает Telegram (символы вне BMP, например эмодзи, — за два)."""
+    return len(text.encode('utf-16-le')) // 2
+
+
+def truncate_utf16(text: str, limit: int) -> str:
+    # Обрезает по границе символа, не разрывая суррогатную пару
+    if utf16_len(text) <= limit:
+        return text
+    return text.encode('utf-16-le')[:limit * 2].decode('utf-16-le', errors='ignore')
+
+
+def pack_messages(parts: list[str], header: str = "", separator: str = "\n\n",
+                  limit: int = TELEGRAM_MESSAGE_LIMIT) -> list[tuple[str, list[int]]]:
+    """
+    Раскладывает части целиком по сообщениям не длиннее limit.
+    Возвращает [(текст, индексы вошедших частей), ...]; header — только в первом
+    сообщении. Часть, которая не влезает даже одна, обрезается.
+    """
+    messages = []
+    text, indexes = header, []
+    for i, part in enumerate(parts):
+        candidate = text + separator + part if indexes else text + part
+        if indexes and utf16_len(candidate) > limit:
+            messages.append((text, indexes))
+            text, indexes = "", []
+            candidate = part
+        if utf16_len(candidate) > limit:
+            candidate = truncate_utf16(candidate, limit)
+        text = candidate
+        indexes.append(i)
+    if indexes:
+        messages.append((text, indexes))
+    return messages
+
+
+class SendQueue:
+    """
+    Единая очередь исходящих сообщений бота.
+
+    Сообщения уходят по одному, не чаще раза в interval секунд; при
+    FloodWaitError очередь ждёт указанное Telegram время и повторяет то же
+    сообщение (до max_flood_retries раз). send() возвращается, когда
+    сообщение отправлено, или пробрасывает ошибку отправки.
+    """
+
+    def __init__(self, client, interval: float = 1.0, max_flood_retries: int = 3):
+        self.client = client
+        self.interval = interval
+        self.max_flood_retries = max_flood_retries
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._last_sent = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._worker())
+
+    async def send(self, entity, text: str, **kwargs):
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((entity, text, kwargs, future))
+        return await future
+
+    async def _worker(self):
+        while True:
+            entity, text, kwargs, future = await self._queue.get()
+            try:
+                result = await self._send_with_retries(entity, text, kwargs)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+    async def _send_with_retries(self, entity, text: str, kwargs: dict):
+        for attempt in range(self.max_flood_retries + 1):
+            delay = self._last_sent + self.interval - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            try:
+                return await self.client.send_message(entity, text, **kwargs)
+            except FloodWaitError as e:
+                if attempt >= self.max_flood_retries:
+                    raise
+                print(f"[SEND QUEUE] FloodWait {e.seconds} с для {entity}, повтор {attempt + 1}/{self.max_flood_retries}")
+                await asyncio.sleep(e.seconds)
+            finally:
+                self._last_sent = time.monotonic()